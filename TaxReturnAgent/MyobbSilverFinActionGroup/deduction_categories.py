@@ -0,0 +1,160 @@
+#1 imports - Deduction categories of transaction names, following the sections of TaxReturnAgent/Questionaire.txt
+import os
+import re
+from collections import deque
+from functools import lru_cache
+
+#2 Configuration - override through the Lambda environment variables
+# Distinct normalized names remembered - books repeat the same few hundred names
+CATEGORY_CACHE_SIZE = int(os.environ.get("CATEGORY_CACHE_SIZE", "4096"))
+
+# Category -> (keywords, merchants), matched as whole words of the lower-cased name with punctuation removed. A
+# keyword ending in * matches any word starting with it ("textbook*" matches "Textbooks"). When several match, what
+# was bought beats where ("Woolworths Caltex fuel" is a motor vehicle expense), then the longest keyword wins, then
+# the category listed first - "interest on investment loan" is an investment expense even though "loan" is not.
+CATEGORY_RULES = [
+    ("Motor vehicle expenses", [
+        "motor vehicle", "vehicle*", "car", "cars", "fuel", "petrol", "diesel", "rego", "registration", "tyre*",
+        "parking", "toll*", "logbook", "car service", "car wash"
+    ], ["bp", "shell", "caltex", "ampol", "7 eleven", "linkt"]),
+    ("Work-related expenses", [
+        "uniform*", "laundry", "dry cleaning", "protective", "safety boots", "tool*", "laptop*", "computer*",
+        "monitor*", "keyboard", "printer*", "office chair", "desk", "stationery", "home office", "mobile phone",
+        "phone plan", "phone bill", "internet", "nbn", "software", "work related"
+    ], ["officeworks", "jb hi fi"]),
+    ("Self-education expenses", [
+        "self education", "course*", "tuition", "textbook*", "seminar*", "conference*", "workshop*",
+        "university", "tafe", "study", "exam fee*"
+    ], ["udemy", "coursera"]),
+    ("Union and professional association fees", [
+        "union", "union fee*", "union membership", "professional association", "professional membership",
+        "professional body", "professional registration", "practising certificate"
+    ], ["cpa", "ca anz"]),
+    ("Donations", [
+        "donation*", "donate*", "charity", "charitable"
+    ], [
+        "red cross", "salvation army", "salvos", "unicef", "oxfam", "world vision", "cancer council", "smith family", "rspca"
+    ]),
+    ("Tax agent fees", [
+        "tax agent", "tax return", "tax preparation", "accountant", "accounting fee*"
+    ], ["h r block", "etax"]),
+    ("Investment expenses", [
+        "interest on investment", "investment loan", "margin loan", "investment property", "rental property",
+        "management fee*", "share portfolio", "brokerage", "financial advice", "financial adviser", "platform fee*"
+    ], ["commsec"]),
+    ("Private health insurance", [
+        "private health", "health insurance"
+    ], ["medibank", "bupa", "hcf", "nib", "ahm", "hbf"]),
+    ("Private expenses", [
+        "groceries", "grocery", "rent", "mortgage", "restaurant*", "takeaway", "gym", "clothing", "holiday"
+    ], ["woolworths", "coles", "aldi", "iga", "netflix", "spotify"]),
+]
+
+_NOT_WORD = re.compile(r"[^a-z0-9]+")
+
+
+#3 Compile every keyword into one Aho-Corasick automaton over the space-padded name, so a name is classified in a
+# single pass over its characters however many rules there are. Keywords are padded with spaces to match whole
+# words only, and the transitions are completed into a DFA so the scan is one dict lookup per character.
+# https://en.wikipedia.org/wiki/Aho%E2%80%93Corasick_algorithm
+def _compile(rules):
+    goto = [{}]
+    best = [None]
+    for rank, (category, keywords, merchants) in enumerate(rules):
+        for specific, keyword in [(1, keyword) for keyword in keywords] + [(0, merchant) for merchant in merchants]:
+            prefix = keyword.endswith("*")
+            words = _NOT_WORD.sub(" ", keyword.rstrip("*").lower()).strip()
+            pattern = " " + words + ("" if prefix else " ")
+            state = 0
+            for char in pattern:
+                following = goto[state].get(char)
+                if following is None:
+                    following = goto[state][char] = len(goto)
+                    goto.append({})
+                    best.append(None)
+                state = following
+            candidate = (specific, len(words), -rank, category)
+            if best[state] is None or candidate > best[state]:
+                best[state] = candidate
+
+    alphabet = {char for transitions in goto for char in transitions}
+    fail = [0] * len(goto)
+    delta = [dict() for _ in goto]
+    for char in alphabet:
+        delta[0][char] = goto[0].get(char, 0)
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        # A state also reports the best keyword ending at its failure state (a suffix of what was read)
+        inherited = best[fail[state]]
+        if inherited is not None and (best[state] is None or inherited > best[state]):
+            best[state] = inherited
+        for char in alphabet:
+            following = goto[state].get(char)
+            if following is None:
+                delta[state][char] = delta[fail[state]][char]
+            else:
+                fail[following] = delta[fail[state]][char]
+                delta[state][char] = following
+                queue.append(following)
+    return delta, best
+
+
+_DELTA, _BEST = _compile(CATEGORY_RULES)
+
+
+def normalize_name(name):
+    return " " + _NOT_WORD.sub(" ", str(name or "").lower()).strip() + " "
+
+
+#4 Category of one normalized name, or None when no keyword matches - memoized, so a repeated name costs a lookup
+@lru_cache(maxsize=CATEGORY_CACHE_SIZE)
+def _category_of_normalized(text):
+    delta = _DELTA
+    best = _BEST
+    state = 0
+    found = None
+    for char in text:
+        state = delta[state].get(char, 0)
+        candidate = best[state]
+        if candidate is not None and (found is None or candidate > found):
+            found = candidate
+    return found[3] if found else None
+
+
+def classify(name):
+    if not name:
+        return None
+    return _category_of_normalized(normalize_name(name))
+
+
+# A stored category (set at ingestion or by the accountant) is kept, otherwise the name is classified
+def category_of(item):
+    return item.get("category") or classify(item.get("transactionName"))
+
+
+#5 Classify a batch in place - each distinct name is classified once per batch, and only items without a stored
+# category get one
+def classify_items(items):
+    seen = {}
+    for item in items:
+        if item.get("category"):
+            continue
+        name = item.get("transactionName")
+        if name in seen:
+            category = seen[name]
+        else:
+            category = seen[name] = classify(name)
+        if category:
+            item["category"] = category
+    return items
+
+
+# Same for the (item, key) entries of transactions_reader.iter_transactions, as they are read
+def classify_entries(entries):
+    for item, key in entries:
+        if not item.get("category"):
+            category = classify(item.get("transactionName"))
+            if category:
+                item["category"] = category
+        yield item, key
@@ -0,0 +1,95 @@
+#1 imports - Timed spans, embedded-metric-format lines and level-gated, sampled logging for the action group
+import json
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+
+#2 Configuration - override through the Lambda environment variables
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+LOG_LEVEL = LOG_LEVELS.get(os.environ.get("LOG_LEVEL", "INFO").upper(), 20)
+# Share of invocations whose full payloads are logged when LOG_LEVEL is DEBUG
+PAYLOAD_LOG_SAMPLE_RATE = float(os.environ.get("PAYLOAD_LOG_SAMPLE_RATE", "0.1"))
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "HackAranda/MyobbSilverFinActionGroup")
+
+
+#3 Every line goes to stdout (CloudWatch Logs in Lambda) - sys.stdout is looked up on each write so it can be captured
+def _write(record):
+    sys.stdout.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+
+
+def is_enabled(level):
+    return LOG_LEVELS[level] >= LOG_LEVEL
+
+
+def log(level, message, **fields):
+    if not is_enabled(level):
+        return
+    record = {"level": level, "message": message}
+    record.update(fields)
+    _write(record)
+
+
+#4 Full payloads are only logged at DEBUG, and then only for a sample of the calls
+def log_payload(name, payload, sample_rate=None):
+    if not is_enabled("DEBUG"):
+        return
+    if sample_rate is None:
+        sample_rate = PAYLOAD_LOG_SAMPLE_RATE
+    if random.random() >= sample_rate:
+        return
+    _write({"level": "DEBUG", "message": f"payload {name}", "payload": payload})
+
+
+#5 Metrics of one invocation, written as a single embedded-metric-format line
+# https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+class Invocation:
+    def __init__(self, api_path=None):
+        self.started = time.perf_counter()
+        self.dimensions = {"ApiPath": api_path or "direct"}
+        self.metrics = {}
+        self.properties = {}
+
+    def set(self, name, value, unit="Count"):
+        self.metrics[name] = (value, unit)
+
+    def add(self, name, value, unit="Count"):
+        current = self.metrics.get(name, (0, unit))[0]
+        self.metrics[name] = (current + value, unit)
+
+    def add_time(self, name, milliseconds):
+        self.add(f"{name}Ms", milliseconds, "Milliseconds")
+
+    def set_property(self, name, value):
+        self.properties[name] = value
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, (time.perf_counter() - started) * 1000)
+
+    def to_record(self):
+        if "TotalMs" not in self.metrics:
+            self.add_time("Total", (time.perf_counter() - self.started) * 1000)
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [list(self.dimensions)],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in self.metrics.items()]
+                }]
+            }
+        }
+        record.update(self.properties)
+        record.update(self.dimensions)
+        for name, (value, _) in self.metrics.items():
+            record[name] = round(value, 3) if isinstance(value, float) else value
+        return record
+
+    def emit(self):
+        _write(self.to_record())
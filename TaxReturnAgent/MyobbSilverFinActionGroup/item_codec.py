@@ -0,0 +1,94 @@
+#1 imports - Decode DynamoDB attribute values to plain JSON types and encode compact responses
+import base64
+import json
+import re
+
+# Attribute names the agent may ask for in the fields parameter
+_FIELD_NAME = re.compile(r"^[A-Za-z0-9_]+$")
+
+
+#2 Decode one attribute value - https://docs.aws.amazon.com/amazondynamodb/latest/APIReference/API_AttributeValue.html
+# A small dispatch table is several times faster than boto3's TypeDeserializer, and returns int/float instead of Decimal
+def _number(value):
+    if "." in value or "e" in value or "E" in value:
+        return float(value)
+    return int(value)
+
+
+def _binary(value):
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode()
+    return value
+
+
+_DECODERS = {
+    "S": lambda value: value,
+    "N": _number,
+    "BOOL": lambda value: value,
+    "NULL": lambda value: None,
+    "M": lambda value: {name: decode_value(attribute) for name, attribute in value.items()},
+    "L": lambda value: [decode_value(attribute) for attribute in value],
+    "SS": lambda value: list(value),
+    "NS": lambda value: [_number(number) for number in value],
+    "B": _binary,
+    "BS": lambda value: [_binary(binary) for binary in value],
+}
+
+
+def decode_value(attribute):
+    type_name, value = next(iter(attribute.items()))
+    return _DECODERS[type_name](value)
+
+
+#3 Decode whole items
+def decode_item(item):
+    return {name: decode_value(attribute) for name, attribute in item.items()}
+
+
+def decode_items(items):
+    return [decode_item(item) for item in items]
+
+
+#4 Turn the comma separated fields parameter into a list of safe attribute names
+def parse_fields(fields_parameter):
+    if not fields_parameter:
+        return None
+    fields = [field.strip() for field in fields_parameter.split(",")]
+    fields = [field for field in fields if _FIELD_NAME.match(field)]
+    return fields or None
+
+
+#5 ProjectionExpression for the requested fields - names go through placeholders since `date` is a reserved word
+# https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/Expressions.ProjectionExpressions.html
+def projection_kwargs(fields, names=None):
+    names = dict(names or {})
+    placeholders = []
+    for index, field in enumerate(fields):
+        placeholder = f"#f{index}"
+        names[placeholder] = field
+        placeholders.append(placeholder)
+    return {"ProjectionExpression": ", ".join(placeholders), "ExpressionAttributeNames": names}
+
+
+#6 Compact JSON - no whitespace between separators
+def dumps_compact(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+#7 Columnar layout - the attribute names are written once instead of once per row
+def to_columns(items, fields=None):
+    columns = list(fields) if fields else []
+    if not fields:
+        seen = set()
+        for item in items:
+            for name in item:
+                if name not in seen:
+                    seen.add(name)
+                    columns.append(name)
+    return {"columns": columns, "rows": [[item.get(name) for name in columns] for item in items]}
+
+
+def encode_items(items, layout="rows", fields=None):
+    if layout == "columnar":
+        return dumps_compact(to_columns(items, fields))
+    return dumps_compact(items)
@@ -1,115 +1,430 @@
-#1 imports - For room booking - Boto3, json and uuid
-import json
-import boto3
-import uuid
+#1 imports - Only what every path needs; boto3 is loaded with the client on the first read
+import os
+from datetime import date
+import transactions_reader
+import result_cache
+import transactions_summary
+import transactions_anomalies
+import transactions_reconciliation
+import receipt_matching
+import deduction_categories
+import response_paging
+import item_codec
+import instrumentation
 
-#2 Create a client connection -  https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb.html
-client = boto3.client('dynamodb')
+#2 Create the client connection on first use -  https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb.html
+# The pool has a connection per scan segment, keep-alive avoids new TLS handshakes between warm invocations,
+# and adaptive retries back off on throttling. DYNAMODB_ENDPOINT_URL points at DynamoDB Local for testing.
+# https://botocore.amazonaws.com/v1/documentation/api/latest/reference/config.html
+DYNAMODB_MAX_POOL_CONNECTIONS = int(os.environ.get('DYNAMODB_MAX_POOL_CONNECTIONS', max(10, transactions_reader.SCAN_TOTAL_SEGMENTS)))
+DYNAMODB_MAX_ATTEMPTS = int(os.environ.get('DYNAMODB_MAX_ATTEMPTS', '5'))
+DYNAMODB_ENDPOINT_URL = os.environ.get('DYNAMODB_ENDPOINT_URL')
 
-#3 Store the user input - Print the event details from agent
-def lambda_handler(event, context):
-    print(f"The user input from Agent is {event}")
-    input_data = event
-
-    #4. Get all items from hack-aranda-myobb-silverfine-table using scan method https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/scan.html
-    response = client.scan(TableName='hack-aranda-myobb-silverfine-table')
-    print(response)
-
-    #5. Check if any items exist in the database
-    if 'Items' not in response or len(response['Items']) == 0:
-        # Create proper Bedrock Agent error response for no data found
-        error_response_body = {
-            'application/json': {
-                'body': json.dumps({'error': 'No transactions data found in the database.'})
-            }
-        }
-        
-        action_response = {
-            'actionGroup': event['actionGroup'],
-            'apiPath': event['apiPath'],
-            'httpMethod': event['httpMethod'],
-            'httpStatusCode': 404,
-            'responseBody': error_response_body
-        }
-        
-        session_attributes = event['sessionAttributes']
-        prompt_session_attributes = event['promptSessionAttributes']
-        
-        api_response = {
-            'messageVersion': '1.0', 
-            'response': action_response,
-            'sessionAttributes': session_attributes,
-            'promptSessionAttributes': prompt_session_attributes
-        }
-        
-        print(f"No data found in database. Returning error response: {api_response}")
-        return api_response
-        
-    myobb_silverfine_data = response['Items']
-    print(myobb_silverfine_data)
-
-
-    #6 Check if this is a Bedrock Agent call or direct test call
-    if 'agent' in event and 'actionGroup' in event:
-        # This is a Bedrock Agent call - return proper agent response
-        agent = event['agent']
-        actionGroup = event['actionGroup']
-        api_path = event['apiPath']
-
-        response_body = {
-            'application/json': {
-                'body': json.dumps(myobb_silverfine_data)
-            }
-        }
-        
-        action_response = {
-            'actionGroup': event['actionGroup'],
-            'apiPath': event['apiPath'],
-            'httpMethod': event['httpMethod'],
-            'httpStatusCode': 200,
-            'responseBody': response_body
-        }
-        
-        session_attributes = event['sessionAttributes']
-        prompt_session_attributes = event['promptSessionAttributes']
-        
-        #https://docs.aws.amazon.com/bedrock/latest/userguide/agents-lambda.html#agents-lambda-example
-        api_response = {
-            'messageVersion': '1.0', 
-            'response': action_response,
-            'sessionAttributes': session_attributes,
-            'promptSessionAttributes': prompt_session_attributes
-        }
-        
-        return api_response
+client = None
+
+
+def get_client():
+    global client
+    if client is None:
+        import boto3
+        from botocore.config import Config
+        config = Config(
+            max_pool_connections=DYNAMODB_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
+            connect_timeout=2,
+            read_timeout=10,
+            retries={'mode': 'adaptive', 'max_attempts': DYNAMODB_MAX_ATTEMPTS}
+        )
+        client = boto3.client('dynamodb', config=config, endpoint_url=DYNAMODB_ENDPOINT_URL)
+    return client
+
+
+# Lives as long as the warm container, like the client above
+cache = result_cache.ResultCache()
+
+
+#3 Parameters - https://docs.aws.amazon.com/bedrock/latest/userguide/agents-lambda.html#agents-lambda-input
+# Each operation declares the parameters it reads and how to parse them. A value that does not parse is a 400
+# before anything is read.
+class BadParameter(ValueError):
+    pass
+
+
+def iso_date(value):
+    return date.fromisoformat(str(value)).isoformat()
+
+
+def date_window_days(value):
+    days = int(value)
+    if not 0 <= days <= transactions_reconciliation.RECONCILIATION_MAX_DATE_WINDOW_DAYS:
+        raise ValueError(f'{days} is outside 0..{transactions_reconciliation.RECONCILIATION_MAX_DATE_WINDOW_DAYS}')
+    return days
+
+
+COMMON_PARAMETERS = {'clientId': str, 'fromDate': iso_date, 'toDate': iso_date}
+
+
+def parse_parameters(event, parsers):
+    params = {}
+    for parameter in event.get('parameters') or []:
+        name = parameter.get('name')
+        value = parameter.get('value')
+        parser = parsers.get(name)
+        if parser is None or value is None or value == '':
+            continue
+        try:
+            params[name] = parser(value)
+        except (TypeError, ValueError):
+            raise BadParameter(f'Invalid value for {name}: {value!r}')
+    return params
+
+
+class ClientMismatch(ValueError):
+    pass
+
+
+# The client identifier comes from the session attributes set by the caller first. The clientId API parameter is
+# filled in by the model, so it may only name the session's client, or pick one when the session has none.
+def get_client_id(event, params):
+    for attributes_key in ['sessionAttributes', 'promptSessionAttributes']:
+        attributes = event.get(attributes_key) or {}
+        if attributes.get('clientId'):
+            if params.get('clientId') and params['clientId'] != attributes['clientId']:
+                raise ClientMismatch(f"clientId {params['clientId']!r} is not the client of this session")
+            return attributes['clientId']
+    return params.get('clientId')
+
+
+#4 One response envelope for every operation - https://docs.aws.amazon.com/bedrock/latest/userguide/agents-lambda.html#agents-lambda-example
+# Direct test calls (no agent in the event) get the same envelope with empty routing fields.
+def is_agent_call(event):
+    return 'agent' in event and 'actionGroup' in event
+
+
+def build_response(event, status_code, body):
+    if not isinstance(body, str):
+        body = item_codec.dumps_compact(body)
+    routing = event if is_agent_call(event) else {}
+    return {
+        'messageVersion': '1.0',
+        'response': {
+            'actionGroup': routing.get('actionGroup', ''),
+            'apiPath': routing.get('apiPath', ''),
+            'httpMethod': routing.get('httpMethod', ''),
+            'httpStatusCode': status_code,
+            'responseBody': {'application/json': {'body': body}}
+        },
+        'sessionAttributes': routing.get('sessionAttributes') or {},
+        'promptSessionAttributes': routing.get('promptSessionAttributes') or {}
+    }
+
+
+def not_found(request):
+    instrumentation.log('INFO', 'No data found in database. Returning error response', clientId=request['client_id'])
+    return 404, {'error': 'No transactions data found in the database.'}
+
+
+# Look the key up in the warm-container cache - entries are only served while the client's data version has not moved
+def check_cache(request, cache_key):
+    with request['invocation'].span('VersionCheck'):
+        data_version = result_cache.get_data_version(get_client(), request['client_id'])
+    cached = cache.get(cache_key, data_version)
+    request['invocation'].set('CacheHit', 1 if cached is not None else 0)
+    return data_version, cached
+
+
+#5 Get the client's items from hack-aranda-myobb-silverfine-table using query method https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/query.html
+# Without a client identifier fall back to a scan of the whole table, following every page over parallel segments.
+# Only the given fields are read, and repeated reads are served from the warm-container cache.
+def read_items(request, fields):
+    invocation = request['invocation']
+    params = request['params']
+    client_id = request['client_id']
+    cache_key = result_cache.make_key(
+        client_id,
+        fromDate=params.get('fromDate'),
+        toDate=params.get('toDate'),
+        fields=tuple(fields or ())
+    )
+    data_version, cached = check_cache(request, cache_key)
+    if cached is not None:
+        scan_result = {'items': cached['items'], 'pages': 0, 'truncated': False}
+    else:
+        with invocation.span('Read'):
+            scan_result = transactions_reader.read_transactions(
+                get_client(),
+                transactions_reader.get_deadline(request['context']),
+                client_id=client_id,
+                from_date=params.get('fromDate'),
+                to_date=params.get('toDate'),
+                fields=fields
+            )
+        invocation.add_time('Decode', scan_result['decode_ms'])
+        invocation.set('Pages', scan_result['pages'])
+        invocation.set('ConsumedCapacity', scan_result['consumed_capacity'])
+        if scan_result['truncated']:
+            instrumentation.log('WARNING', 'Read time budget exhausted - returning the items read so far', clientId=client_id)
+        else:
+            cache.put(cache_key, data_version, scan_result['items'], None)
+    invocation.set('Items', len(scan_result['items']))
+    invocation.set('Truncated', 1 if scan_result['truncated'] else 0)
+    instrumentation.log_payload('items', scan_result['items'])
+    return scan_result
+
+
+# Results computed over a read cut short by the time budget say so, with the number of items they were computed from
+def mark_truncated(body, *scan_results):
+    if any(scan_result['truncated'] for scan_result in scan_results):
+        body['truncated'] = True
+        body['itemsRead'] = sum(len(scan_result['items']) for scan_result in scan_results)
+    return body
+
+
+#6 Operations - each takes the request and returns (httpStatusCode, body)
+# The list is paged - items are read and encoded only until the response byte budget is used, and a
+# continuationToken for the rest is returned with them. Rows without a stored category get one from the
+# deduction_categories rules as they are read.
+def list_transactions(request):
+    params = request['params']
+    invocation = request['invocation']
+    client_id = request['client_id']
+    fields = item_codec.parse_fields(params.get('fields'))
+    layout = 'columnar' if params.get('format') == 'columnar' else 'rows'
+    # A category asked for by name needs the name read too - take_within_budget drops it again
+    read_fields = fields
+    if fields and 'category' in fields and 'transactionName' not in fields:
+        read_fields = fields + ['transactionName']
+
+    fingerprint = response_paging.query_fingerprint(
+        clientId=client_id,
+        fromDate=params.get('fromDate'),
+        toDate=params.get('toDate'),
+        fields=fields,
+        layout=layout
+    )
+    start_key = None
+    if params.get('continuationToken'):
+        try:
+            start_key = response_paging.decode_token(params['continuationToken'], fingerprint)
+        except response_paging.InvalidToken as e:
+            return 400, {'error': str(e)}
+
+    cache_key = result_cache.make_key(
+        client_id,
+        fromDate=params.get('fromDate'),
+        toDate=params.get('toDate'),
+        fields=tuple(fields or ()),
+        layout=layout,
+        continuationToken=params.get('continuationToken'),
+        maxBytes=response_paging.RESPONSE_MAX_BYTES
+    )
+    data_version, cached = check_cache(request, cache_key)
+    if cached is not None:
+        return 200, cached['body']
+
+    stats = {}
+    with invocation.span('Read'):
+        entries = transactions_reader.iter_transactions(
+            get_client(),
+            transactions_reader.get_deadline(request['context']),
+            client_id=client_id,
+            from_date=params.get('fromDate'),
+            to_date=params.get('toDate'),
+            fields=read_fields,
+            start_key=start_key,
+            page_limit=response_paging.PAGE_READ_LIMIT,
+            stats=stats
+        )
+        if not fields or 'category' in fields:
+            entries = deduction_categories.classify_entries(entries)
+        items, last_key, more = response_paging.take_within_budget(entries, layout, fields)
+    invocation.add_time('Decode', stats['decode_ms'])
+    invocation.set('Pages', stats['pages'])
+    invocation.set('ConsumedCapacity', stats['consumed_capacity'])
+    invocation.set('Items', len(items))
+    invocation.set('Truncated', 1 if stats['truncated'] else 0)
+    if not items and start_key is None:
+        return not_found(request)
+
+    # Running out of time also ends the page early - the token resumes after the last item returned
+    token = None
+    if (more or stats['truncated']) and last_key:
+        token = response_paging.encode_token(last_key, fingerprint)
+    invocation.set('HasMore', 1 if token else 0)
+    with invocation.span('Serialize'):
+        body = response_paging.page_body(items, layout, fields, token)
+    if not stats['truncated']:
+        cache.put(cache_key, data_version, None, body)
+    return 200, body
+
+
+# Whole-book summaries are served from the aggregates maintained by the MyobbSilverFinAggregateStream Lambda when
+# that table is configured - date ranges are computed from the transactions
+def get_summary(request):
+    params = request['params']
+    if request['client_id'] and transactions_reader.AGGREGATE_TABLE_NAME and not params.get('fromDate') and not params.get('toDate'):
+        with request['invocation'].span('ReadAggregates'):
+            aggregate_result = transactions_reader.read_aggregates(
+                get_client(),
+                transactions_reader.get_deadline(request['context']),
+                request['client_id']
+            )
+        summary = transactions_summary.summarize_aggregates(aggregate_result['items'])
+        if summary['count']:
+            return 200, mark_truncated(summary, aggregate_result)
+
+    scan_result = read_items(request, transactions_summary.SUMMARY_FIELDS)
+    if not scan_result['items']:
+        return not_found(request)
+    with request['invocation'].span('Summarize'):
+        deduction_categories.classify_items(scan_result['items'])
+        return 200, mark_truncated(transactions_summary.summarize(scan_result['items']), scan_result)
+
+
+def get_anomalies(request):
+    scan_result = read_items(request, transactions_anomalies.ANOMALY_FIELDS)
+    if not scan_result['items']:
+        return not_found(request)
+    with request['invocation'].span('Score'):
+        body = transactions_anomalies.find_anomalies(
+            scan_result['items'],
+            financial_year=request['params'].get('financialYear')
+        )
+    return 200, mark_truncated(body, scan_result)
+
+
+def get_reconciliation(request):
+    scan_result = read_items(request, transactions_reconciliation.RECONCILIATION_FIELDS)
+    if not scan_result['items']:
+        return not_found(request)
+    with request['invocation'].span('Reconcile'):
+        body = transactions_reconciliation.reconcile(
+            scan_result['items'],
+            window_days=request['params'].get('dateWindowDays', transactions_reconciliation.RECONCILIATION_DATE_WINDOW_DAYS)
+        )
+    return 200, mark_truncated(body, scan_result)
+
+
+# Set once the receipts table turns out to be missing or not readable, like the version table in result_cache - the
+# large transactions without a receipt are still reported
+receipt_table_missing = False
+
+
+def read_receipts(request):
+    global receipt_table_missing
+    no_receipts = {'items': [], 'truncated': False}
+    if receipt_table_missing:
+        return no_receipts
+    from botocore.exceptions import ClientError
+
+    try:
+        with request['invocation'].span('ReadReceipts'):
+            return transactions_reader.read_receipts(
+                get_client(),
+                transactions_reader.get_deadline(request['context']),
+                request['client_id']
+            )
+    except ClientError as e:
+        code = e.response['Error']['Code']
+        if code not in ('ResourceNotFoundException', 'AccessDeniedException'):
+            raise
+        instrumentation.log('WARNING', 'Receipts table cannot be read - reporting no receipts',
+                            table=transactions_reader.RECEIPT_TABLE_NAME, error=code)
+        receipt_table_missing = True
+        return no_receipts
+
+
+def get_unmatched_receipts(request):
+    scan_result = read_items(request, receipt_matching.RECEIPT_MATCH_FIELDS)
+    if not scan_result['items']:
+        return not_found(request)
+    receipts = read_receipts(request)
+    with request['invocation'].span('MatchReceipts'):
+        body = receipt_matching.unmatched_receipts_body(
+            receipts['items'],
+            scan_result['items'],
+            transactions_anomalies.LARGE_AMOUNT_WITHOUT_RECEIPT
+        )
+    if receipt_table_missing:
+        body['receiptsUnavailable'] = True
+    return 200, mark_truncated(body, scan_result, receipts)
+
+
+# Direct lambda test call - every attribute of the items with a summary
+def direct_test_call(request):
+    scan_result = read_items(request, item_codec.parse_fields(request['params'].get('fields')))
+    if not scan_result['items']:
+        return not_found(request)
+    deduction_categories.classify_items(scan_result['items'])
+    return 200, {
+        'message': 'Successfully retrieved transactions data',
+        'data': scan_result['items'],
+        'count': len(scan_result['items']),
+        'truncated': scan_result['truncated'],
+        'summary': transactions_summary.summarize(scan_result['items'])
+    }
+
+
+# The operations of openai_schema.yml, keyed by (apiPath, httpMethod), with the parameters each one reads
+# on top of COMMON_PARAMETERS
+OPERATIONS = {
+    ('/transactions', 'GET'): {'handler': list_transactions, 'parameters': {'fields': str, 'format': str, 'continuationToken': str}},
+    ('/transactions/summary', 'GET'): {'handler': get_summary, 'parameters': {}},
+    ('/transactions/anomalies', 'GET'): {'handler': get_anomalies, 'parameters': {'financialYear': str}},
+    ('/transactions/unmatched-receipts', 'GET'): {'handler': get_unmatched_receipts, 'parameters': {}},
+    ('/reconciliation', 'GET'): {'handler': get_reconciliation, 'parameters': {'dateWindowDays': date_window_days}},
+}
+DIRECT_TEST_CALL = {'handler': direct_test_call, 'parameters': {'fields': str}}
+
+
+#7 Route the event - unknown operations and bad parameters are answered before any I/O.
+# The event is logged sampled, at DEBUG only.
+def handle_event(event, context, invocation):
+    instrumentation.log_payload('event', event)
+
+    if is_agent_call(event):
+        route = (event.get('apiPath'), str(event.get('httpMethod') or '').upper())
+        operation = OPERATIONS.get(route)
+        if operation is None:
+            instrumentation.log('WARNING', 'Unknown operation', apiPath=route[0], httpMethod=route[1])
+            return build_response(event, 404, {
+                'error': f'Unknown operation {route[1]} {route[0]}',
+                'operations': [f'{method} {path}' for path, method in OPERATIONS]
+            })
     else:
-        # This is a direct lambda test call - return simple response
-        # https://docs.aws.amazon.com/bedrock/latest/userguide/agents-lambda.html#agents-lambda-example
-        print("Direct lambda test call detected - returning simple response")
-        # Create similar structure to line 77 for consistency
-        response_body = {
-            'application/json': {
-                'body': json.dumps({
-                    'message': 'Successfully retrieved transactions data',
-                    'data': myobb_silverfine_data,
-                    'count': len(myobb_silverfine_data)
-                })
-            }
-        }
-        
-        action_response = {
-            'actionGroup': '',
-            'apiPath': '',
-            'httpMethod': '',
-            'httpStatusCode': 200,
-            'responseBody': response_body
-        }
-        
-        api_response = {
-            'messageVersion': '1.0', 
-            'response': action_response,
-            'sessionAttributes': {},
-            'promptSessionAttributes': {}
-        }
-        
+        instrumentation.log('INFO', 'Direct lambda test call detected - returning simple response')
+        operation = DIRECT_TEST_CALL
+
+    try:
+        params = parse_parameters(event, {**COMMON_PARAMETERS, **operation['parameters']})
+    except BadParameter as e:
+        return build_response(event, 400, {'error': str(e)})
+    try:
+        client_id = get_client_id(event, params)
+    except ClientMismatch as e:
+        instrumentation.log('WARNING', 'clientId parameter does not match the session client', apiPath=event.get('apiPath'))
+        return build_response(event, 403, {'error': str(e)})
+
+    request = {
+        'event': event,
+        'context': context,
+        'invocation': invocation,
+        'params': params,
+        'client_id': client_id
+    }
+    status_code, body = operation['handler'](request)
+    return build_response(event, status_code, body)
+
+
+#8 Entry point - handle the event and always write one metrics line per invocation
+def lambda_handler(event, context):
+    invocation = instrumentation.Invocation(event.get('apiPath'))
+    try:
+        api_response = handle_event(event, context, invocation)
+        response = api_response['response']
+        invocation.set('StatusCode', response['httpStatusCode'], 'None')
+        invocation.set('ResponseBytes', len(response['responseBody']['application/json']['body']), 'Bytes')
+        instrumentation.log_payload('response', api_response)
         return api_response
+    finally:
+        invocation.emit()
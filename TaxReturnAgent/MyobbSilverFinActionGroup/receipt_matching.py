@@ -0,0 +1,223 @@
+#1 imports - Match extracted receipts (amount, date, merchant) to transactions through an amount/date index
+import os
+from bisect import bisect_left, bisect_right
+from datetime import date
+from transactions_summary import amount_of, has_receipt
+from deduction_categories import category_of
+from transactions_reconciliation import name_similarity, tokens_of
+import transactions_reader
+import item_codec
+import response_paging
+
+#2 Configuration - override through the Lambda environment variables
+RECEIPT_DATE_WINDOW_DAYS = int(os.environ.get("RECEIPT_DATE_WINDOW_DAYS", "7"))
+# Receipt totals may differ from the bank amount by card surcharges or rounding
+RECEIPT_AMOUNT_TOLERANCE = float(os.environ.get("RECEIPT_AMOUNT_TOLERANCE", "0.50"))
+RECEIPT_MAX_RESULTS = int(os.environ.get("RECEIPT_MAX_RESULTS", "50"))
+
+# Attributes the matching needs - used as the read projection of the transactions
+RECEIPT_MATCH_FIELDS = ["transactionId", "date", "transactionName", "amount", "hasReceipt", "receiptRef", "category"]
+
+# Index buckets are one tolerance wide, so a lookup only touches the receipt's bucket and its two neighbours
+_BUCKET_CENTS = max(1, round(RECEIPT_AMOUNT_TOLERANCE * 100))
+# TransactWriteItems takes up to 100 actions - two per link (transaction and receipt)
+_LINKS_PER_TRANSACTION = 50
+# Tries of a batch cancelled by concurrent writes rather than by links that already exist
+_LINK_ATTEMPTS = 3
+
+
+def _day(value):
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+#3 Index of the transactions that have no receipt yet - amount bucket -> entries sorted by date
+class ReceiptIndex:
+    def __init__(self, transactions):
+        self.buckets = {}
+        for transaction in transactions:
+            if transaction.get("receiptRef"):
+                continue
+            amount = amount_of(transaction)
+            day = _day(transaction.get("date"))
+            if amount is None or day is None or not transaction.get("transactionId"):
+                continue
+            cents = round(abs(amount) * 100)
+            self.buckets.setdefault(cents // _BUCKET_CENTS, []).append((day, cents, transaction))
+        for entries in self.buckets.values():
+            entries.sort(key=lambda entry: entry[0])
+        self.days = {bucket: [entry[0] for entry in entries] for bucket, entries in self.buckets.items()}
+        self.taken = set()
+
+    # Unlinked transactions within the amount tolerance and date window, best first
+    def candidates(self, cents, day, merchant, window_days=RECEIPT_DATE_WINDOW_DAYS):
+        merchant_tokens = tokens_of(merchant)
+        found = []
+        for bucket in (cents // _BUCKET_CENTS - 1, cents // _BUCKET_CENTS, cents // _BUCKET_CENTS + 1):
+            entries = self.buckets.get(bucket)
+            if not entries:
+                continue
+            days = self.days[bucket]
+            for position in range(bisect_left(days, day - window_days), bisect_right(days, day + window_days)):
+                entry_day, entry_cents, transaction = entries[position]
+                difference = abs(entry_cents - cents)
+                if difference > _BUCKET_CENTS or transaction["transactionId"] in self.taken:
+                    continue
+                similarity = name_similarity(merchant_tokens, tokens_of(transaction.get("transactionName")))
+                found.append((difference, abs(entry_day - day), -similarity, transaction))
+        found.sort(key=lambda candidate: candidate[:3])
+        return found
+
+
+#4 Match receipts in bulk - exact amounts first, so a near amount does not take an exact receipt's transaction
+def match_receipts(receipts, transactions, window_days=RECEIPT_DATE_WINDOW_DAYS):
+    index = ReceiptIndex(transactions)
+    pending = []
+    unmatched = []
+    for receipt in receipts:
+        if receipt.get("transactionId"):
+            continue
+        amount = amount_of(receipt)
+        day = _day(receipt.get("date"))
+        if amount is None or day is None:
+            unmatched.append((receipt, "amount or date is missing"))
+            continue
+        pending.append((round(abs(amount) * 100), day, receipt))
+
+    matches = []
+    scored = []
+    for cents, day, receipt in pending:
+        candidates = index.candidates(cents, day, receipt.get("merchant"), window_days)
+        scored.append((candidates[0][:3] if candidates else (float("inf"),), cents, day, receipt))
+    scored.sort(key=lambda entry: entry[0])
+    for _, cents, day, receipt in scored:
+        candidates = index.candidates(cents, day, receipt.get("merchant"), window_days)
+        if not candidates:
+            unmatched.append((receipt, f"no transaction of {cents / 100:.2f} within {window_days} days"))
+            continue
+        transaction = candidates[0][3]
+        index.taken.add(transaction["transactionId"])
+        matches.append((receipt, transaction))
+    return {"matches": matches, "unmatched": unmatched}
+
+
+#5 Body of /transactions/unmatched-receipts - receipts without a transaction, and large transactions without a receipt.
+# Each list holds up to max_results rows and the two share the response byte budget - the receipts may take half,
+# the transactions the rest. The counts are always the totals.
+def unmatched_receipts_body(receipts, transactions, large_amount, max_results=RECEIPT_MAX_RESULTS,
+                            max_bytes=response_paging.RESPONSE_MAX_BYTES):
+    result = match_receipts(receipts, transactions)
+    linked = {transaction["transactionId"] for _, transaction in result["matches"]}
+    without_receipt = [
+        transaction for transaction in transactions
+        if not has_receipt(transaction) and transaction.get("transactionId") not in linked
+        and (amount_of(transaction) or 0) >= large_amount
+    ]
+    without_receipt.sort(key=lambda transaction: amount_of(transaction), reverse=True)
+    body = {
+        "receipts": len(receipts),
+        "linked": sum(1 for receipt in receipts if receipt.get("transactionId")),
+        "matchable": len(result["matches"]),
+        "unmatchedReceipts": [],
+        "unmatchedReceiptCount": len(result["unmatched"]),
+        "largeTransactionsWithoutReceipt": [],
+        "largeTransactionsWithoutReceiptCount": len(without_receipt)
+    }
+    budget = max_bytes - len(item_codec.dumps_compact(body))
+    receipt_rows = (
+        ({
+            "receiptId": receipt.get("receiptId"),
+            "document": receipt.get("document"),
+            "merchant": receipt.get("merchant"),
+            "date": receipt.get("date"),
+            "amount": amount_of(receipt),
+            "reason": reason
+        }, None)
+        for receipt, reason in result["unmatched"][:max_results]
+    )
+    body["unmatchedReceipts"] = response_paging.take_within_budget(receipt_rows, max_bytes=budget // 2)[0]
+    transaction_rows = (
+        ({
+            "transactionId": transaction.get("transactionId"),
+            "date": transaction.get("date"),
+            "transactionName": transaction.get("transactionName"),
+            "amount": amount_of(transaction),
+            "category": category_of(transaction)
+        }, None)
+        for transaction in without_receipt[:max_results]
+    )
+    budget -= len(item_codec.dumps_compact(body["unmatchedReceipts"]))
+    body["largeTransactionsWithoutReceipt"] = response_paging.take_within_budget(transaction_rows, max_bytes=budget)[0]
+    return body
+
+
+#6 Write the links - each transaction gets hasReceipt/receiptRef and each receipt the transactionId, in batches of
+# TransactWriteItems so a transaction and its receipt are never linked one-sided.
+# https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/transact_write_items.html
+def _link_actions(client_id, receipt, transaction, transactions_table, receipts_table, partition_key):
+    return [
+        {
+            "Update": {
+                "TableName": transactions_table,
+                "Key": {partition_key: {"S": client_id}, "transactionId": {"S": transaction["transactionId"]}},
+                "UpdateExpression": "SET #hasReceipt = :true, #receiptRef = :receiptId",
+                "ConditionExpression": "attribute_exists(#transactionId) AND attribute_not_exists(#receiptRef)",
+                "ExpressionAttributeNames": {"#hasReceipt": "hasReceipt", "#receiptRef": "receiptRef", "#transactionId": "transactionId"},
+                "ExpressionAttributeValues": {":true": {"BOOL": True}, ":receiptId": {"S": receipt["receiptId"]}}
+            }
+        },
+        {
+            "Update": {
+                "TableName": receipts_table,
+                "Key": {partition_key: {"S": client_id}, "receiptId": {"S": receipt["receiptId"]}},
+                "UpdateExpression": "SET #transactionId = :transactionId",
+                "ConditionExpression": "attribute_not_exists(#transactionId)",
+                "ExpressionAttributeNames": {"#transactionId": "transactionId"},
+                "ExpressionAttributeValues": {":transactionId": {"S": transaction["transactionId"]}}
+            }
+        }
+    ]
+
+
+def write_links(client, client_id, matches, transactions_table=transactions_reader.TABLE_NAME,
+                receipts_table=transactions_reader.RECEIPT_TABLE_NAME, partition_key=transactions_reader.PARTITION_KEY):
+    written = 0
+    conflicts = 0
+    failed = 0
+    for start in range(0, len(matches), _LINKS_PER_TRANSACTION):
+        chunk = matches[start:start + _LINKS_PER_TRANSACTION]
+        attempts = 0
+        # Retried without the links whose conditions failed (linked by someone else in the meantime) until the rest
+        # is written. Links cancelled for another reason (a concurrent write) are retried as they are, and given up
+        # as failed after _LINK_ATTEMPTS.
+        while chunk:
+            actions = []
+            for receipt, transaction in chunk:
+                actions.extend(_link_actions(client_id, receipt, transaction, transactions_table, receipts_table, partition_key))
+            try:
+                client.transact_write_items(TransactItems=actions)
+            except Exception as e:
+                reasons = getattr(e, "response", {}).get("CancellationReasons") or []
+                if not reasons:
+                    raise
+                codes = {}
+                for position, reason in enumerate(reasons):
+                    if reason.get("Code") not in (None, "None"):
+                        codes.setdefault(position // 2, set()).add(reason["Code"])
+                if not codes:
+                    raise
+                dropped = {link for link, link_codes in codes.items() if "ConditionalCheckFailed" in link_codes}
+                conflicts += len(dropped)
+                if not dropped:
+                    attempts += 1
+                    if attempts >= _LINK_ATTEMPTS:
+                        dropped = set(codes)
+                        failed += len(dropped)
+                        attempts = 0
+                chunk = [link for position, link in enumerate(chunk) if position not in dropped]
+                continue
+            written += len(chunk)
+            break
+    return {"written": written, "conflicts": conflicts, "failed": failed}
@@ -0,0 +1,73 @@
+#1 imports - Byte-budgeted pages of /transactions with an opaque continuation token
+import base64
+import hashlib
+import json
+import os
+import item_codec
+
+#2 Configuration - override through the Lambda environment variables
+# Bedrock agents reject action group responses over 25 KB - keep the body well under it
+RESPONSE_MAX_BYTES = int(os.environ.get("RESPONSE_MAX_BYTES", "20000"))
+# Items read per request while filling a page - about what fits in the budget, so few reads are wasted
+PAGE_READ_LIMIT = int(os.environ.get("PAGE_READ_LIMIT", str(max(25, RESPONSE_MAX_BYTES // 100))))
+
+# Room kept for the wrapper around the rows: {"items":...,"count":...,"continuationToken":"..."}
+_ENVELOPE_BYTES = 600
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+#3 The token is the ExclusiveStartKey of the next page plus a fingerprint of the query it belongs to, so a token
+# cannot be replayed against another client, date range or field list
+def query_fingerprint(**query):
+    return hashlib.sha1(item_codec.dumps_compact(sorted(query.items())).encode()).hexdigest()[:12]
+
+
+def encode_token(start_key, fingerprint):
+    payload = item_codec.dumps_compact({"k": start_key, "q": fingerprint})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_token(token, fingerprint):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        start_key, token_fingerprint = payload["k"], payload["q"]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidToken("continuationToken is not valid")
+    if token_fingerprint != fingerprint or not isinstance(start_key, dict):
+        raise InvalidToken("continuationToken belongs to a different query")
+    return start_key
+
+
+#4 Take (item, key) entries until the next row would go over the budget - returns the rows, the key of the last
+# row taken and whether more entries remain. At least one row is always taken.
+def take_within_budget(entries, layout="rows", fields=None, max_bytes=RESPONSE_MAX_BYTES):
+    items = []
+    last_key = None
+    used = _ENVELOPE_BYTES
+    for item, key in entries:
+        if fields:
+            item = {name: item[name] for name in fields if name in item}
+        row = [item.get(name) for name in fields] if layout == "columnar" and fields else item
+        row_bytes = len(item_codec.dumps_compact(row)) + 1
+        if items and used + row_bytes > max_bytes:
+            return items, last_key, True
+        items.append(item)
+        last_key = key
+        used += row_bytes
+    return items, last_key, False
+
+
+#5 Body of one page - always the same object, so the agent handles one shape: the items (or columns and rows),
+# their count, and the token of the next page when there is one
+def page_body(items, layout, fields, token=None):
+    if layout == "columnar":
+        body = item_codec.to_columns(items, fields)
+    else:
+        body = {"items": items}
+    body["count"] = len(items)
+    if token is not None:
+        body["continuationToken"] = token
+    return item_codec.dumps_compact(body)
@@ -0,0 +1,119 @@
+#1 imports - Warm-container cache of transaction reads, invalidated by a per-client version counter
+import os
+import time
+from collections import OrderedDict
+import instrumentation
+
+#2 Configuration - override through the Lambda environment variables
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "32"))
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get("RESULT_CACHE_TTL_SECONDS", "300"))
+
+# One item per client ({"clientId": {"S": ...}, "version": {"N": ...}}), bumped by every writer of the client's book.
+# Reads that are not scoped to a client use the ALL_CLIENTS item.
+VERSION_TABLE_NAME = os.environ.get("VERSION_TABLE_NAME", "hack-aranda-myobb-silverfine-versions")
+ALL_CLIENTS = "*"
+
+# Set once the version table turns out to be missing or not readable by the Lambda role, so we stop paying for a
+# failing call on every turn
+_version_table_missing = False
+
+
+#3 Build a cache key from the client and the query parameters
+def make_key(client_id, **params):
+    return (client_id or ALL_CLIENTS,) + tuple(sorted(params.items()))
+
+
+#4 Get the cheap per-client version counter - a single-item GetItem instead of re-reading the book
+# https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/get_item.html
+def get_data_version(client, client_id):
+    global _version_table_missing
+    if _version_table_missing or not VERSION_TABLE_NAME:
+        return None
+
+    from botocore.exceptions import ClientError
+
+    try:
+        response = client.get_item(
+            TableName=VERSION_TABLE_NAME,
+            Key={"clientId": {"S": client_id or ALL_CLIENTS}},
+            ProjectionExpression="version"
+        )
+    except ClientError as e:
+        code = e.response["Error"]["Code"]
+        if code not in ("ResourceNotFoundException", "AccessDeniedException"):
+            raise
+        instrumentation.log("WARNING", "Version table cannot be read - relying on the cache TTL only", table=VERSION_TABLE_NAME, error=code)
+        _version_table_missing = True
+        return None
+
+    item = response.get("Item")
+    if not item:
+        return "0"
+    return item["version"]["N"]
+
+
+# Writers call this after changing a client's book, so warm containers stop serving their cached reads. Returns
+# False when the version table is missing or not writable - the write itself stands, and cached reads of the book
+# expire with the TTL.
+# https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/update_item.html
+def bump_data_version(client, client_id):
+    global _version_table_missing
+    if _version_table_missing or not VERSION_TABLE_NAME:
+        return False
+
+    from botocore.exceptions import ClientError
+
+    try:
+        for key in (client_id, ALL_CLIENTS):
+            client.update_item(
+                TableName=VERSION_TABLE_NAME,
+                Key={"clientId": {"S": key}},
+                UpdateExpression="ADD #version :one",
+                ExpressionAttributeNames={"#version": "version"},
+                ExpressionAttributeValues={":one": {"N": "1"}}
+            )
+    except ClientError as e:
+        code = e.response["Error"]["Code"]
+        if code not in ("ResourceNotFoundException", "AccessDeniedException"):
+            raise
+        instrumentation.log("WARNING", "Version table cannot be written - cached reads expire with the TTL only", table=VERSION_TABLE_NAME, error=code)
+        _version_table_missing = True
+        return False
+    return True
+
+
+#5 Bounded LRU cache with a TTL - entries also go stale as soon as the client's version moves
+class ResultCache:
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, ttl_seconds=RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def get(self, key, version):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["stored_at"] > self.ttl_seconds or entry["version"] != version:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, version, items, body):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = {
+            "version": version,
+            "items": items,
+            "body": body,
+            "stored_at": time.monotonic()
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,147 @@
+#1 imports - Deterministic anomaly scoring of transactions for /transactions/anomalies
+import os
+import re
+from datetime import date
+from transactions_summary import amount_of, has_receipt, percentile
+from deduction_categories import category_of
+import item_codec
+import response_paging
+
+#2 Configuration - override through the Lambda environment variables
+# Iglewicz and Hoaglin's cut-off for the modified z-score
+ANOMALY_Z_THRESHOLD = float(os.environ.get("ANOMALY_Z_THRESHOLD", "3.5"))
+ANOMALY_IQR_MULTIPLIER = float(os.environ.get("ANOMALY_IQR_MULTIPLIER", "3.0"))
+# The ATO asks for written evidence once work-related claims go over $300
+LARGE_AMOUNT_WITHOUT_RECEIPT = float(os.environ.get("LARGE_AMOUNT_WITHOUT_RECEIPT", "300"))
+ANOMALY_MAX_RESULTS = int(os.environ.get("ANOMALY_MAX_RESULTS", "50"))
+
+# Attributes the scoring needs - used as the read projection
+ANOMALY_FIELDS = ["transactionId", "date", "transactionName", "amount", "hasReceipt", "category"]
+
+_NOT_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def _normalized_name(item):
+    return _NOT_WORD.sub(" ", str(item.get("transactionName") or "").lower()).strip()
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+#3 Financial year bounds from "FY2025" / "2025" (1 July 2024 - 30 June 2025)
+def financial_year_bounds(financial_year):
+    digits = re.sub(r"\D", "", financial_year or "")
+    if len(digits) != 4:
+        return None
+    end_year = int(digits)
+    return date(end_year - 1, 7, 1), date(end_year, 6, 30)
+
+
+#4 Score every transaction in one pass after the order statistics are known
+def find_anomalies(items, financial_year=None, today=None, max_results=ANOMALY_MAX_RESULTS,
+                   max_bytes=response_paging.RESPONSE_MAX_BYTES):
+    today = today or date.today()
+    bounds = financial_year_bounds(financial_year)
+
+    rows = []
+    for item in items:
+        amount = amount_of(item)
+        if amount is not None:
+            rows.append((item, amount))
+    if not rows:
+        return {"count": 0, "flaggedCount": 0, "flagged": []}
+
+    amounts = sorted(amount for _, amount in rows)
+    median = percentile(amounts, 50)
+    q1 = percentile(amounts, 25)
+    q3 = percentile(amounts, 75)
+    p90 = percentile(amounts, 90)
+    iqr = q3 - q1
+    upper_fence = q3 + ANOMALY_IQR_MULTIPLIER * iqr
+    lower_fence = q1 - ANOMALY_IQR_MULTIPLIER * iqr
+    deviations = sorted(abs(amount - median) for amount in amounts)
+    mad = percentile(deviations, 50)
+
+    # Duplicates are found with one hash of (date, amount, name) per row
+    duplicate_counts = {}
+    for item, amount in rows:
+        key = (str(item.get("date")), amount, _normalized_name(item))
+        duplicate_counts[key] = duplicate_counts.get(key, 0) + 1
+
+    flagged = []
+    for item, amount in rows:
+        reasons = []
+        score = 0.0
+
+        if mad:
+            robust_z = 0.6745 * (amount - median) / mad
+            if abs(robust_z) > ANOMALY_Z_THRESHOLD:
+                reasons.append(f"amount is an outlier (robust z-score {robust_z:.1f})")
+                score += abs(robust_z)
+        elif iqr and (amount > upper_fence or amount < lower_fence):
+            reasons.append(f"amount is outside the IQR fences ({lower_fence:.2f} - {upper_fence:.2f})")
+            score += ANOMALY_Z_THRESHOLD
+
+        copies = duplicate_counts[(str(item.get("date")), amount, _normalized_name(item))]
+        if copies > 1:
+            reasons.append(f"possible duplicate - {copies} transactions with the same date, amount and name")
+            score += 2.0
+
+        if amount >= LARGE_AMOUNT_WITHOUT_RECEIPT and not has_receipt(item):
+            reasons.append(f"amount of {amount:.2f} has no receipt")
+            score += 1.0 + amount / max(p90, 1.0)
+
+        transaction_date = _parse_date(item.get("date"))
+        if transaction_date is None:
+            reasons.append("date is missing or invalid")
+            score += 1.0
+        else:
+            if transaction_date > today:
+                reasons.append("dated in the future")
+                score += 2.0
+            if bounds and not bounds[0] <= transaction_date <= bounds[1]:
+                reasons.append(f"outside financial year {financial_year}")
+                score += 1.5
+            if transaction_date.weekday() >= 5 and amount >= p90:
+                reasons.append("large amount on a weekend")
+                score += 0.5
+
+        if reasons:
+            flagged.append((score, item, reasons))
+
+    flagged.sort(key=lambda entry: entry[0], reverse=True)
+    body = {
+        "count": len(rows),
+        "flaggedCount": len(flagged),
+        "thresholds": {
+            "median": round(median, 2),
+            "mad": round(mad, 2),
+            "iqrFences": [round(lower_fence, 2), round(upper_fence, 2)],
+            "largeWithoutReceipt": LARGE_AMOUNT_WITHOUT_RECEIPT
+        },
+        "flagged": []
+    }
+    # Most abnormal first, up to max_results and as many as fit in the response byte budget
+    entries = ((_flagged_row(item, reasons), None) for _, item, reasons in flagged[:max_results])
+    body["flagged"] = response_paging.take_within_budget(entries, max_bytes=max_bytes - len(item_codec.dumps_compact(body)))[0]
+    return body
+
+
+def _flagged_row(item, reasons):
+    row = {
+        "date": item.get("date"),
+        "transactionName": item.get("transactionName"),
+        "amount": amount_of(item),
+        "hasReceipt": has_receipt(item),
+        "reasons": reasons
+    }
+    if item.get("transactionId"):
+        row["transactionId"] = item["transactionId"]
+    category = category_of(item)
+    if category:
+        row["category"] = category
+    return row
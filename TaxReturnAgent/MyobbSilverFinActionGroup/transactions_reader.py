@@ -0,0 +1,224 @@
+#1 imports - Paginated and parallel segmented reads of the transactions table
+import os
+import time
+import item_codec
+
+#2 Configuration - override through the Lambda environment variables
+TABLE_NAME = os.environ.get("TRANSACTIONS_TABLE_NAME", "hack-aranda-myobb-silverfine-table")
+SCAN_TOTAL_SEGMENTS = int(os.environ.get("SCAN_TOTAL_SEGMENTS", "4"))
+SCAN_TIME_BUDGET_MS = int(os.environ.get("SCAN_TIME_BUDGET_MS", "20000"))
+
+# Each client's book lives under its own partition key, with a GSI (partition key + date) for date ranges.
+# Set DATE_INDEX_NAME to an empty string to filter dates on the base table instead.
+PARTITION_KEY = os.environ.get("PARTITION_KEY", "clientId")
+SORT_KEY = os.environ.get("SORT_KEY", "transactionId")
+DATE_ATTRIBUTE = "date"
+DATE_INDEX_NAME = os.environ.get("DATE_INDEX_NAME", "clientId-date-index")
+
+# Per-client aggregates kept up to date by the MyobbSilverFinAggregateStream Lambda - summaries are read from it when set
+AGGREGATE_TABLE_NAME = os.environ.get("AGGREGATE_TABLE_NAME", "")
+
+# Receipts extracted from the uploaded documents: partition key clientId, sort key receiptId, with amount, date,
+# merchant, document and the transactionId of the matched transaction once linked
+RECEIPT_TABLE_NAME = os.environ.get("RECEIPT_TABLE_NAME", "hack-aranda-myobb-silverfine-receipts")
+
+# Time kept back from the Lambda timeout to serialize and return the response
+TIME_BUDGET_SAFETY_MS = 2000
+
+
+#3 Work out when reading has to stop for this invocation
+def get_deadline(context, budget_ms=SCAN_TIME_BUDGET_MS):
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        budget_ms = min(budget_ms, context.get_remaining_time_in_millis() - TIME_BUDGET_SAFETY_MS)
+    return time.monotonic() + max(budget_ms, 0) / 1000
+
+
+#4 Call scan or query page by page, following LastEvaluatedKey until the end or the deadline.
+# Each page is decoded to plain JSON types as it arrives so the wire-format items are not held twice.
+def _read_pages(operation, kwargs, deadline):
+    kwargs["ReturnConsumedCapacity"] = "TOTAL"
+    result = {"items": [], "pages": 0, "truncated": False, "consumed_capacity": 0.0, "decode_ms": 0.0}
+    while True:
+        response = operation(**kwargs)
+        result["pages"] += 1
+        result["consumed_capacity"] += response.get("ConsumedCapacity", {}).get("CapacityUnits", 0.0)
+
+        decode_started = time.perf_counter()
+        result["items"].extend(item_codec.decode_items(response.get("Items", [])))
+        result["decode_ms"] += (time.perf_counter() - decode_started) * 1000
+
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return result
+        if time.monotonic() >= deadline:
+            result["truncated"] = True
+            return result
+        kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+#5 Scan one segment (or the whole table)
+# https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/scan.html
+def _scan_segment(client, scan_kwargs, deadline, segment=None, total_segments=None):
+    kwargs = dict(scan_kwargs)
+    if total_segments:
+        kwargs["Segment"] = segment
+        kwargs["TotalSegments"] = total_segments
+    return _read_pages(client.scan, kwargs, deadline)
+
+
+#6 Read the whole table, fanning out over Segment/TotalSegments on a thread pool
+# https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/Scan.html#Scan.ParallelScan
+def scan_all(client, deadline, table_name=TABLE_NAME, total_segments=SCAN_TOTAL_SEGMENTS, **scan_kwargs):
+    scan_kwargs["TableName"] = table_name
+
+    if total_segments <= 1:
+        return _scan_segment(client, scan_kwargs, deadline)
+
+    # boto3 clients are thread safe, so every segment shares the same connection pool.
+    # The thread pool is only imported on this path, single-partition queries never need it.
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        futures = [
+            executor.submit(_scan_segment, client, scan_kwargs, deadline, segment, total_segments)
+            for segment in range(total_segments)
+        ]
+        results = [future.result() for future in futures]
+
+    merged = {"items": [], "pages": 0, "truncated": False, "consumed_capacity": 0.0, "decode_ms": 0.0}
+    for result in results:
+        merged["items"].extend(result["items"])
+        merged["pages"] += result["pages"]
+        merged["truncated"] = merged["truncated"] or result["truncated"]
+        merged["consumed_capacity"] += result["consumed_capacity"]
+        merged["decode_ms"] += result["decode_ms"]
+    return merged
+
+
+#7 Build the date range condition - `date` is a DynamoDB reserved word so it goes through #date
+def _date_condition(from_date, to_date, values):
+    if from_date and to_date:
+        values[":fromDate"] = {"S": from_date}
+        values[":toDate"] = {"S": to_date}
+        return "#date BETWEEN :fromDate AND :toDate"
+    if from_date:
+        values[":fromDate"] = {"S": from_date}
+        return "#date >= :fromDate"
+    if to_date:
+        values[":toDate"] = {"S": to_date}
+        return "#date <= :toDate"
+    return None
+
+
+#8 Query one client's partition, following LastEvaluatedKey until the end or the deadline
+# https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/query.html
+def _query_kwargs(client_id, from_date=None, to_date=None, fields=None, table_name=TABLE_NAME):
+    names = {"#pk": PARTITION_KEY}
+    values = {":pk": {"S": client_id}}
+    kwargs = {"TableName": table_name}
+
+    date_condition = _date_condition(from_date, to_date, values)
+    key_condition = "#pk = :pk"
+    if date_condition:
+        names["#date"] = DATE_ATTRIBUTE
+        if DATE_INDEX_NAME:
+            kwargs["IndexName"] = DATE_INDEX_NAME
+            key_condition += " AND " + date_condition
+        else:
+            kwargs["FilterExpression"] = date_condition
+
+    kwargs["KeyConditionExpression"] = key_condition
+    kwargs["ExpressionAttributeNames"] = names
+    kwargs["ExpressionAttributeValues"] = values
+    if fields:
+        kwargs.update(item_codec.projection_kwargs(fields, names))
+    return kwargs
+
+
+def query_all(client, deadline, client_id, from_date=None, to_date=None, fields=None, table_name=TABLE_NAME):
+    return _read_pages(client.query, _query_kwargs(client_id, from_date, to_date, fields, table_name), deadline)
+
+
+def _scan_kwargs(from_date=None, to_date=None, fields=None):
+    scan_kwargs = {}
+    names = {}
+    values = {}
+    date_condition = _date_condition(from_date, to_date, values)
+    if date_condition:
+        names["#date"] = DATE_ATTRIBUTE
+        scan_kwargs["FilterExpression"] = date_condition
+        scan_kwargs["ExpressionAttributeNames"] = names
+        scan_kwargs["ExpressionAttributeValues"] = values
+    if fields:
+        scan_kwargs.update(item_codec.projection_kwargs(fields, names))
+    return scan_kwargs
+
+
+#9 Read a client's transactions with a key-condition query, or scan everything when no client is known.
+# When fields are given only those attributes are read, through a ProjectionExpression.
+def read_transactions(client, deadline, client_id=None, from_date=None, to_date=None, fields=None):
+    if client_id:
+        return query_all(client, deadline, client_id, from_date, to_date, fields)
+    return scan_all(client, deadline, **_scan_kwargs(from_date, to_date, fields))
+
+
+#10 Yield (item, key) one at a time, from start_key on, reading `page_limit` items per request - for callers that
+# stop after a response budget. The key is the wire-format ExclusiveStartKey that resumes right after the item.
+# Reading stops at the deadline with stats["truncated"] set; stats also collects pages and consumed capacity.
+def iter_transactions(client, deadline, client_id=None, from_date=None, to_date=None, fields=None,
+                      start_key=None, page_limit=None, stats=None):
+    stats = stats if stats is not None else {}
+    stats.update(pages=0, consumed_capacity=0.0, decode_ms=0.0, truncated=False)
+    if client_id:
+        operation = client.query
+        kwargs = _query_kwargs(client_id, from_date, to_date, None, TABLE_NAME)
+    else:
+        operation = client.scan
+        kwargs = dict(_scan_kwargs(from_date, to_date, None), TableName=TABLE_NAME)
+
+    # ExclusiveStartKey needs the table key, plus the index key when reading the date index
+    key_names = [PARTITION_KEY, SORT_KEY]
+    if kwargs.get("IndexName"):
+        key_names.append(DATE_ATTRIBUTE)
+    if fields:
+        names = kwargs.get("ExpressionAttributeNames") or {}
+        kwargs.update(item_codec.projection_kwargs(list(dict.fromkeys(list(fields) + key_names)), names))
+
+    kwargs["ReturnConsumedCapacity"] = "TOTAL"
+    if page_limit:
+        kwargs["Limit"] = page_limit
+    if start_key:
+        kwargs["ExclusiveStartKey"] = start_key
+    while True:
+        response = operation(**kwargs)
+        stats["pages"] += 1
+        stats["consumed_capacity"] += response.get("ConsumedCapacity", {}).get("CapacityUnits", 0.0)
+        raw_items = response.get("Items", [])
+        decode_started = time.perf_counter()
+        items = item_codec.decode_items(raw_items)
+        stats["decode_ms"] += (time.perf_counter() - decode_started) * 1000
+        for raw_item, item in zip(raw_items, items):
+            yield item, {name: raw_item[name] for name in key_names if name in raw_item}
+
+        if not response.get("LastEvaluatedKey"):
+            return
+        if time.monotonic() >= deadline:
+            stats["truncated"] = True
+            return
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+#11 Read the materialized month/category aggregates of one client - the size depends on months x categories,
+# not on the number of transactions
+def read_aggregates(client, deadline, client_id, table_name=None):
+    kwargs = {
+        "TableName": table_name or AGGREGATE_TABLE_NAME,
+        "KeyConditionExpression": "#pk = :pk AND begins_with(#sk, :prefix)",
+        "ExpressionAttributeNames": {"#pk": PARTITION_KEY, "#sk": "aggregateKey"},
+        "ExpressionAttributeValues": {":pk": {"S": client_id}, ":prefix": {"S": "AGG#"}}
+    }
+    return _read_pages(client.query, kwargs, deadline)
+
+
+#12 Read the receipts extracted for one client
+def read_receipts(client, deadline, client_id, table_name=None):
+    return query_all(client, deadline, client_id, table_name=table_name or RECEIPT_TABLE_NAME)
@@ -0,0 +1,299 @@
+#1 imports - Match the MYOB and Silverfin ledgers of a client for /reconciliation
+import heapq
+import os
+import re
+from bisect import bisect_left, bisect_right
+from datetime import date
+import item_codec
+import response_paging
+from transactions_summary import amount_of
+
+#2 Configuration - override through the Lambda environment variables
+RECONCILIATION_DATE_WINDOW_DAYS = int(os.environ.get("RECONCILIATION_DATE_WINDOW_DAYS", "3"))
+# Largest dateWindowDays a caller may ask for - wider windows make every date bucket a candidate
+RECONCILIATION_MAX_DATE_WINDOW_DAYS = int(os.environ.get("RECONCILIATION_MAX_DATE_WINDOW_DAYS", "90"))
+# Share of the shorter name's tokens that must appear in the other name
+RECONCILIATION_MIN_NAME_SIMILARITY = float(os.environ.get("RECONCILIATION_MIN_NAME_SIMILARITY", "0.5"))
+# Amounts closer than this (dollars, or share of the amount if larger) are reported as near-misses
+RECONCILIATION_AMOUNT_TOLERANCE = float(os.environ.get("RECONCILIATION_AMOUNT_TOLERANCE", "1.00"))
+RECONCILIATION_AMOUNT_TOLERANCE_SHARE = float(os.environ.get("RECONCILIATION_AMOUNT_TOLERANCE_SHARE", "0.02"))
+# Candidates looked at per unmatched transaction when searching for near-misses
+RECONCILIATION_MAX_CANDIDATES = int(os.environ.get("RECONCILIATION_MAX_CANDIDATES", "200"))
+
+SOURCES = ("myob", "silverfin")
+
+# Attributes the matching needs - used as the read projection
+RECONCILIATION_FIELDS = ["transactionId", "date", "transactionName", "amount", "source"]
+
+_NOT_WORD = re.compile(r"[^a-z0-9]+")
+_token_cache = {}
+
+
+#3 Token sets of transaction names - books repeat the same few hundred names, so each is tokenized once
+def tokens_of(name):
+    tokens = _token_cache.get(name)
+    if tokens is None:
+        tokens = frozenset(token for token in _NOT_WORD.split(str(name or "").lower()) if token)
+        if len(_token_cache) < 100000:
+            _token_cache[name] = tokens
+    return tokens
+
+
+# Token-set similarity - 1.0 when one name's tokens are all in the other ("BP Collins St" / "Fuel - BP Collins St")
+def name_similarity(left, right):
+    if not left or not right:
+        return 1.0 if left == right else 0.0
+    return len(left & right) / min(len(left), len(right))
+
+
+def _day(value):
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+class _Entry:
+    __slots__ = ("item", "cents", "day", "tokens", "matched")
+
+    def __init__(self, item, amount, day):
+        self.item = item
+        self.cents = round(amount * 100)
+        self.day = day
+        self.tokens = tokens_of(item.get("transactionName"))
+        self.matched = False
+
+
+def _entries(items):
+    by_source = {source: [] for source in SOURCES}
+    # A book spans a few hundred distinct dates, so each is parsed once
+    days = {}
+    unusable = 0
+    for item in items:
+        amount = amount_of(item)
+        value = item.get("date")
+        day = days.get(value)
+        if day is None:
+            day = days[value] = _day(value)
+        source = str(item.get("source") or "").lower()
+        if amount is None or day is None or source not in by_source:
+            unusable += 1
+            continue
+        by_source[source].append(_Entry(item, amount, day))
+    return by_source, unusable
+
+
+#4 Matching pass - a hash join on the amount, then a merge on date inside each amount: every MYOB entry takes
+# the most similar unmatched Silverfin entry within the date window. One sort of each side, O(n log n).
+def _match(myob, silverfin, window_days, min_similarity):
+    by_amount = {}
+    for entry in sorted(silverfin, key=lambda entry: entry.day):
+        by_amount.setdefault(entry.cents, []).append(entry)
+    days_by_amount = {cents: [entry.day for entry in entries] for cents, entries in by_amount.items()}
+
+    matched = 0
+    for entry in sorted(myob, key=lambda entry: entry.day):
+        candidates = by_amount.get(entry.cents)
+        if not candidates:
+            continue
+        days = days_by_amount[entry.cents]
+        best = None
+        best_rank = None
+        for position in range(bisect_left(days, entry.day - window_days), bisect_right(days, entry.day + window_days)):
+            candidate = candidates[position]
+            if candidate.matched:
+                continue
+            similarity = name_similarity(entry.tokens, candidate.tokens)
+            if similarity < min_similarity:
+                continue
+            rank = (similarity, -abs(candidate.day - entry.day))
+            if best_rank is None or rank > best_rank:
+                best, best_rank = candidate, rank
+        if best is not None:
+            entry.matched = best.matched = True
+            matched += 1
+    return matched
+
+
+#5 Near-miss pass over what is left - candidates come from an inverted index of (name token, date bucket) whose
+# postings are sorted by amount, so only entries close in date, within the amount tolerance and sharing a word are
+# scored, at most RECONCILIATION_MAX_CANDIDATES of them. Same-amount entries are added by amount. Buckets are as
+# wide as the dates within reach of an entry, so a lookup touches at most two per token.
+def _near_misses(myob, silverfin, window_days, min_similarity):
+    reach = 2 * window_days
+    bucket_days = 2 * reach + 1
+    # Filled in amount order, so every posting is sorted by amount without sorting it
+    index = {}
+    by_amount = {}
+    for position in sorted(range(len(silverfin)), key=lambda position: silverfin[position].cents):
+        entry = silverfin[position]
+        bucket = entry.day // bucket_days
+        for token in entry.tokens:
+            posting = index.get((token, bucket))
+            if posting is None:
+                posting = index[(token, bucket)] = ([], [])
+            posting[0].append(entry.cents)
+            posting[1].append(position)
+        by_amount.setdefault(entry.cents, []).append(position)
+    # The postings of a name over a range of buckets - names and dates repeat, so each is collected once
+    postings_of = {}
+    similarities = {}
+
+    near_misses = []
+    for entry in myob:
+        amount = entry.cents / 100
+        tolerance = round(max(RECONCILIATION_AMOUNT_TOLERANCE, abs(amount) * RECONCILIATION_AMOUNT_TOLERANCE_SHARE) * 100)
+
+        first_bucket = (entry.day - reach) // bucket_days
+        last_bucket = (entry.day + reach) // bucket_days
+        postings = postings_of.get((entry.tokens, first_bucket, last_bucket))
+        if postings is None:
+            keys = [(token, bucket) for token in entry.tokens for bucket in range(first_bucket, last_bucket + 1)]
+            postings = postings_of[(entry.tokens, first_bucket, last_bucket)] = [index[key] for key in keys if key in index]
+
+        # Each posting cut to the amount tolerance, then taken shortest (rarest token) first until the candidate cap
+        low = entry.cents - tolerance
+        high = entry.cents + tolerance
+        ranges = []
+        found = 0
+        for amounts, positions in postings:
+            first = bisect_left(amounts, low)
+            if first < len(amounts) and amounts[first] <= high:
+                size = bisect_right(amounts, high, first) - first
+                ranges.append((size, first, positions))
+                found += size
+        if found > RECONCILIATION_MAX_CANDIDATES:
+            ranges.sort(key=lambda found: found[0])
+        candidates = set()
+        for size, first, positions in ranges:
+            candidates.update(positions[first:first + min(size, RECONCILIATION_MAX_CANDIDATES - len(candidates))])
+            if len(candidates) >= RECONCILIATION_MAX_CANDIDATES:
+                break
+        # Same amount with an unrelated name is a near-miss too, even though no token is shared
+        same_amount = by_amount.get(entry.cents, ())
+        candidates.update(same_amount[:max(0, RECONCILIATION_MAX_CANDIDATES - len(candidates))])
+
+        # Reasons are only written out for the best candidate
+        best = None
+        day, cents, tokens = entry.day, entry.cents, entry.tokens
+        amount_scale = max(tolerance, 1)
+        for position in candidates:
+            candidate = silverfin[position]
+            gap = abs(candidate.day - day)
+            difference = abs(candidate.cents - cents)
+            if gap > reach or difference > tolerance:
+                continue
+            similarity = similarities.get((tokens, candidate.tokens))
+            if similarity is None:
+                similarity = similarities[(tokens, candidate.tokens)] = name_similarity(tokens, candidate.tokens)
+            # At most two of amount, date and name may disagree
+            disagree = (difference > 0) + (gap > window_days) + (similarity < min_similarity)
+            if disagree == 0 or disagree > 2:
+                continue
+            score = similarity - difference / amount_scale - gap / (reach + 1)
+            if best is None or score > best[0]:
+                best = (score, candidate, similarity, difference, gap)
+        if best is not None:
+            score, candidate, similarity, difference, gap = best
+            reasons = []
+            if difference:
+                reasons.append(f"amounts differ by {difference / 100:.2f}")
+            if gap > window_days:
+                reasons.append(f"dates are {gap} days apart")
+            if similarity < min_similarity:
+                reasons.append("names differ")
+            near_misses.append((score, entry, candidate, similarity, reasons))
+
+    near_misses.sort(key=lambda near_miss: near_miss[0], reverse=True)
+    # A Silverfin entry is reported against one MYOB entry only
+    used = set()
+    unique = []
+    for near_miss in near_misses:
+        if id(near_miss[2]) in used:
+            continue
+        used.add(id(near_miss[2]))
+        unique.append(near_miss)
+    return unique
+
+
+#6 Reconcile the ledgers - only the unmatched transactions and near-misses are returned. Rows are added most
+# important first - near-misses closest first, then the unmatched transactions of both ledgers largest first - until
+# the body would go over the response byte budget; counts always holds the totals.
+def reconcile(items, window_days=RECONCILIATION_DATE_WINDOW_DAYS, min_similarity=RECONCILIATION_MIN_NAME_SIMILARITY,
+              max_bytes=response_paging.RESPONSE_MAX_BYTES):
+    by_source, unusable = _entries(items)
+    myob, silverfin = by_source["myob"], by_source["silverfin"]
+    matched = _match(myob, silverfin, window_days, min_similarity)
+
+    unmatched_myob = [entry for entry in myob if not entry.matched]
+    unmatched_silverfin = [entry for entry in silverfin if not entry.matched]
+    near_misses = _near_misses(unmatched_myob, unmatched_silverfin, window_days, min_similarity)
+
+    # Entries explained by a near-miss are not repeated in the unmatched lists
+    explained = {id(entry) for _, left, right, _, _ in near_misses for entry in (left, right)}
+    unmatched = {
+        "myob": [entry for entry in unmatched_myob if id(entry) not in explained],
+        "silverfin": [entry for entry in unmatched_silverfin if id(entry) not in explained]
+    }
+
+    result = {
+        "counts": {
+            "myob": len(myob),
+            "silverfin": len(silverfin),
+            "matched": matched,
+            "nearMisses": len(near_misses),
+            "unmatchedMyob": len(unmatched["myob"]),
+            "unmatchedSilverfin": len(unmatched["silverfin"])
+        },
+        "dateWindowDays": window_days,
+        "nearMisses": [],
+        "unmatched": {"myob": [], "silverfin": []}
+    }
+    if unusable:
+        result["counts"]["skipped"] = unusable
+
+    rows = _rows_by_importance(near_misses, unmatched, result)
+    total = len(near_misses) + len(unmatched["myob"]) + len(unmatched["silverfin"])
+    # Room kept for the omitted count and the wrapper the handler may add
+    used = len(item_codec.dumps_compact(result)) + 100
+    added = 0
+    for target, row in rows:
+        row_bytes = len(item_codec.dumps_compact(row)) + 1
+        if used + row_bytes > max_bytes:
+            break
+        target.append(row)
+        used += row_bytes
+        added += 1
+    if added < total:
+        result["counts"]["omitted"] = total - added
+    return result
+
+
+# (list, row) pairs in the order they are added to the body - rows are only built when they are taken
+def _rows_by_importance(near_misses, unmatched, result):
+    for _, left, right, similarity, reasons in near_misses:
+        yield result["nearMisses"], {
+            "myob": _row(left),
+            "silverfin": _row(right),
+            "nameSimilarity": round(similarity, 2),
+            "reasons": reasons
+        }
+    by_size = [_largest_first(source, entries) for source, entries in unmatched.items()]
+    for _, source, entry in heapq.merge(*by_size, key=lambda ranked: ranked[0]):
+        yield result["unmatched"][source], _row(entry)
+
+
+def _largest_first(source, entries):
+    for entry in sorted(entries, key=lambda entry: -abs(entry.cents)):
+        yield -abs(entry.cents), source, entry
+
+
+def _row(entry):
+    row = {
+        "date": entry.item.get("date"),
+        "transactionName": entry.item.get("transactionName"),
+        "amount": entry.cents / 100
+    }
+    if entry.item.get("transactionId"):
+        row["transactionId"] = entry.item["transactionId"]
+    return row
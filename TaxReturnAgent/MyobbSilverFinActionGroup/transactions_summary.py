@@ -0,0 +1,149 @@
+#1 imports - Server-side aggregation of transactions for /transactions/summary
+import os
+
+#2 Configuration - keep the summary a few hundred bytes however large the book is
+SUMMARY_MAX_CATEGORIES = int(os.environ.get("SUMMARY_MAX_CATEGORIES", "10"))
+SUMMARY_PERCENTILES = [50, 90, 99]
+UNCATEGORISED = "Uncategorised"
+OTHER_CATEGORIES = "Other"
+
+
+# Attributes the summary needs - used as the read projection
+SUMMARY_FIELDS = ["date", "amount", "category", "hasReceipt", "transactionName"]
+
+
+#3 Read the amount and receipt flag of a decoded item - amounts may be stored as numbers or as strings
+def amount_of(item):
+    value = item.get("amount")
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "").replace("$", ""))
+    except ValueError:
+        return None
+
+
+def has_receipt(item):
+    value = item.get("hasReceipt")
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "1")
+    return bool(value)
+
+
+#4 Percentile with linear interpolation between the closest ranks of a sorted list
+def percentile(sorted_amounts, rank):
+    if not sorted_amounts:
+        return None
+    position = (len(sorted_amounts) - 1) * rank / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_amounts) - 1)
+    fraction = position - lower
+    return sorted_amounts[lower] + (sorted_amounts[upper] - sorted_amounts[lower]) * fraction
+
+
+def _add(totals, key, amount):
+    bucket = totals.get(key)
+    if bucket is None:
+        bucket = totals[key] = {"count": 0, "total": 0.0}
+    bucket["count"] += 1
+    bucket["total"] += amount
+
+
+def _rounded(buckets):
+    return {key: {"count": bucket["count"], "total": round(bucket["total"], 2)} for key, bucket in buckets.items()}
+
+
+#5 Keep the largest categories by total and fold the rest into "Other"
+def _top_categories(by_category, max_categories=SUMMARY_MAX_CATEGORIES):
+    if len(by_category) <= max_categories:
+        return by_category
+    ranked = sorted(by_category.items(), key=lambda entry: abs(entry[1]["total"]), reverse=True)
+    top = dict(ranked[:max_categories])
+    other = {"count": 0, "total": 0.0}
+    for _, bucket in ranked[max_categories:]:
+        other["count"] += bucket["count"]
+        other["total"] += bucket["total"]
+    top[OTHER_CATEGORIES] = other
+    return top
+
+
+#6 One pass over the items for the grouped totals, then a single sort of the amounts for the order statistics
+def summarize(items):
+    amounts = []
+    by_month = {}
+    by_category = {}
+    by_receipt = {}
+    skipped = 0
+
+    for item in items:
+        amount = amount_of(item)
+        if amount is None:
+            skipped += 1
+            continue
+        amounts.append(amount)
+
+        date = str(item.get("date") or "")
+        _add(by_month, date[:7] or "unknown", amount)
+        _add(by_category, item.get("category") or UNCATEGORISED, amount)
+        _add(by_receipt, "withReceipt" if has_receipt(item) else "withoutReceipt", amount)
+
+    amounts.sort()
+    total = sum(amounts)
+    summary = {
+        "count": len(amounts),
+        "total": round(total, 2),
+        "min": amounts[0] if amounts else None,
+        "max": amounts[-1] if amounts else None,
+        "mean": round(total / len(amounts), 2) if amounts else None,
+        "percentiles": {
+            f"p{rank}": round(percentile(amounts, rank), 2) if amounts else None
+            for rank in SUMMARY_PERCENTILES
+        },
+        "byMonth": _rounded(dict(sorted(by_month.items()))),
+        "byCategory": _rounded(_top_categories(by_category)),
+        "byReceipt": _rounded(by_receipt)
+    }
+    if skipped:
+        summary["skippedWithoutAmount"] = skipped
+    return summary
+
+
+#7 Summary from the materialized aggregates - order statistics cannot be maintained incrementally,
+# so min/max/percentiles are left out
+def summarize_aggregates(aggregates):
+    by_month = {}
+    by_category = {}
+    by_receipt = {"withReceipt": {"count": 0, "total": 0.0}, "withoutReceipt": {"count": 0, "total": 0.0}}
+    count = 0
+    total = 0.0
+
+    for aggregate in aggregates:
+        if not aggregate.get("count"):
+            continue
+        aggregate_count = int(aggregate["count"])
+        aggregate_total = float(aggregate.get("total", 0))
+        receipt_count = int(aggregate.get("withReceiptCount", 0))
+        receipt_total = float(aggregate.get("withReceiptTotal", 0))
+        count += aggregate_count
+        total += aggregate_total
+
+        for buckets, key in ((by_month, aggregate["month"]), (by_category, aggregate["category"])):
+            bucket = buckets.setdefault(key, {"count": 0, "total": 0.0})
+            bucket["count"] += aggregate_count
+            bucket["total"] += aggregate_total
+        by_receipt["withReceipt"]["count"] += receipt_count
+        by_receipt["withReceipt"]["total"] += receipt_total
+        by_receipt["withoutReceipt"]["count"] += aggregate_count - receipt_count
+        by_receipt["withoutReceipt"]["total"] += aggregate_total - receipt_total
+
+    return {
+        "count": count,
+        "total": round(total, 2),
+        "mean": round(total / count, 2) if count else None,
+        "byMonth": _rounded(dict(sorted(by_month.items()))),
+        "byCategory": _rounded(_top_categories(by_category)),
+        "byReceipt": _rounded(by_receipt),
+        "source": "aggregates"
+    }
@@ -0,0 +1 @@
+../MyobbSilverFinActionGroup/deduction_categories.py
\ No newline at end of file
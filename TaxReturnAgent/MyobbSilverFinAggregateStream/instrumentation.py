@@ -0,0 +1 @@
+../MyobbSilverFinActionGroup/instrumentation.py
\ No newline at end of file
@@ -0,0 +1,203 @@
+#1 imports - DynamoDB Stream processor that keeps per-client, per-month, per-category totals of the transactions table
+import hashlib
+import json
+import os
+# The action group's rules and logging (symlinked into this function's package), so the aggregates group rows without
+# a stored category the same way the action group classifies them on read, and both functions log the same lines
+import deduction_categories
+import instrumentation
+
+#2 Configuration - override through the Lambda environment variables
+# Aggregate table: partition key clientId, sort key aggregateKey
+#   AGG#<YYYY-MM>#<category> - count, total, withReceiptCount, withReceiptTotal of one month and category
+#   TX#<transaction hash>    - what one transaction currently contributes, and the stream sequence number applied
+AGGREGATE_TABLE_NAME = os.environ.get("AGGREGATE_TABLE_NAME", "hack-aranda-myobb-silverfine-aggregates")
+PARTITION_KEY = os.environ.get("PARTITION_KEY", "clientId")
+UNCATEGORISED = "Uncategorised"
+
+# Built on the first batch, like the action group's client, with the same timeouts and retries
+client = None
+
+
+def get_client():
+    global client
+    if client is None:
+        import boto3
+        from botocore.config import Config
+        config = Config(
+            tcp_keepalive=True,
+            connect_timeout=2,
+            read_timeout=10,
+            retries={"mode": "adaptive", "max_attempts": 5}
+        )
+        client = boto3.client("dynamodb", config=config)
+    return client
+
+
+#3 Read what a transaction image contributes to the aggregates - None when it contributes nothing
+def _plain(attribute):
+    if not attribute:
+        return None
+    type_name, value = next(iter(attribute.items()))
+    return None if type_name == "NULL" else value
+
+
+def contribution_of(image):
+    if not image:
+        return None
+    try:
+        amount = float(str(_plain(image.get("amount"))).replace(",", "").replace("$", ""))
+    except ValueError:
+        return None
+    has_receipt = _plain(image.get("hasReceipt"))
+    if isinstance(has_receipt, str):
+        has_receipt = has_receipt.strip().lower() in ("true", "yes", "1")
+    date = str(_plain(image.get("date")) or "")
+    category = _plain(image.get("category")) or deduction_categories.classify(_plain(image.get("transactionName")))
+    return {
+        "month": date[:7] or "unknown",
+        "category": category or UNCATEGORISED,
+        "amount": amount,
+        "hasReceipt": bool(has_receipt)
+    }
+
+
+def _aggregate_key(contribution):
+    return f"AGG#{contribution['month']}#{contribution['category']}"
+
+
+def _transaction_key(keys):
+    return "TX#" + hashlib.sha1(json.dumps(keys, sort_keys=True).encode()).hexdigest()
+
+
+# Stream sequence numbers are decimal strings of varying length - pad them so they compare as strings
+def _sequence(record):
+    return record["dynamodb"]["SequenceNumber"].zfill(40)
+
+
+#4 The deltas to apply to each aggregate item when a transaction goes from old to new
+def aggregate_deltas(old, new):
+    deltas = {}
+    for contribution, sign in ((old, -1), (new, 1)):
+        if contribution is None:
+            continue
+        delta = deltas.setdefault(_aggregate_key(contribution), {
+            "month": contribution["month"],
+            "category": contribution["category"],
+            "count": 0,
+            "total": 0.0,
+            "withReceiptCount": 0,
+            "withReceiptTotal": 0.0
+        })
+        delta["count"] += sign
+        delta["total"] += sign * contribution["amount"]
+        if contribution["hasReceipt"]:
+            delta["withReceiptCount"] += sign
+            delta["withReceiptTotal"] += sign * contribution["amount"]
+    # A delta is kept if any of its fields moves - hasReceipt flipping on a zero amount only moves withReceiptCount
+    fields = ("count", "total", "withReceiptCount", "withReceiptTotal")
+    return {key: delta for key, delta in deltas.items() if any(delta[name] for name in fields)}
+
+
+def _stored_contribution(item):
+    if not item or "amount" not in item:
+        return None
+    return {
+        "month": item["month"]["S"],
+        "category": item["category"]["S"],
+        "amount": float(item["amount"]["N"]),
+        "hasReceipt": item["hasReceipt"]["BOOL"]
+    }
+
+
+#5 Apply one transaction's latest stream record. The delta is taken against the contribution that was actually
+# applied (not the record's OldImage), and the sequence number guard makes replays and late records no-ops.
+def apply_record(record):
+    dynamodb = record["dynamodb"]
+    new_image = dynamodb.get("NewImage") if record["eventName"] != "REMOVE" else None
+    image = new_image or dynamodb.get("OldImage") or dynamodb["Keys"]
+    client_id = _plain(image.get(PARTITION_KEY)) or _plain(dynamodb["Keys"].get(PARTITION_KEY))
+    transaction_key = _transaction_key(dynamodb["Keys"])
+    sequence = _sequence(record)
+
+    key = {PARTITION_KEY: {"S": client_id}, "aggregateKey": {"S": transaction_key}}
+    stored = get_client().get_item(TableName=AGGREGATE_TABLE_NAME, Key=key, ConsistentRead=True).get("Item")
+    if stored and stored["sequenceNumber"]["S"] >= sequence:
+        return "skipped"
+
+    old = _stored_contribution(stored)
+    new = contribution_of(new_image)
+
+    # The transaction record is kept even after a REMOVE, so an older INSERT arriving late cannot re-add it
+    transaction_item = dict(key)
+    transaction_item["sequenceNumber"] = {"S": sequence}
+    if new is not None:
+        transaction_item["month"] = {"S": new["month"]}
+        transaction_item["category"] = {"S": new["category"]}
+        transaction_item["amount"] = {"N": repr(new["amount"])}
+        transaction_item["hasReceipt"] = {"BOOL": new["hasReceipt"]}
+
+    transact_items = [{
+        "Put": {
+            "TableName": AGGREGATE_TABLE_NAME,
+            "Item": transaction_item,
+            "ConditionExpression": "attribute_not_exists(#sk) OR #seq < :seq",
+            "ExpressionAttributeNames": {"#sk": "aggregateKey", "#seq": "sequenceNumber"},
+            "ExpressionAttributeValues": {":seq": {"S": sequence}}
+        }
+    }]
+    for aggregate_key, delta in aggregate_deltas(old, new).items():
+        transact_items.append({
+            "Update": {
+                "TableName": AGGREGATE_TABLE_NAME,
+                "Key": {PARTITION_KEY: {"S": client_id}, "aggregateKey": {"S": aggregate_key}},
+                "UpdateExpression": "ADD #count :count, #total :total, #rcount :rcount, #rtotal :rtotal SET #month = :month, #category = :category",
+                "ExpressionAttributeNames": {
+                    "#count": "count", "#total": "total", "#rcount": "withReceiptCount", "#rtotal": "withReceiptTotal",
+                    "#month": "month", "#category": "category"
+                },
+                "ExpressionAttributeValues": {
+                    ":count": {"N": str(delta["count"])},
+                    ":total": {"N": repr(round(delta["total"], 2))},
+                    ":rcount": {"N": str(delta["withReceiptCount"])},
+                    ":rtotal": {"N": repr(round(delta["withReceiptTotal"], 2))},
+                    ":month": {"S": delta["month"]},
+                    ":category": {"S": delta["category"]}
+                }
+            }
+        })
+
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/transact_write_items.html
+    try:
+        get_client().transact_write_items(TransactItems=transact_items)
+    except Exception as e:
+        reasons = getattr(e, "response", {}).get("CancellationReasons") or []
+        if reasons and reasons[0].get("Code") == "ConditionalCheckFailed":
+            # A newer record for this transaction was applied concurrently
+            return "skipped"
+        raise
+    return "applied"
+
+
+#6 Entry point - keep only the latest record of each transaction in the batch, then apply them.
+# Failed records are reported back so only they are retried.
+# https://docs.aws.amazon.com/lambda/latest/dg/with-ddb.html#services-ddb-batchfailurereporting
+def lambda_handler(event, context):
+    latest = {}
+    for record in event.get("Records", []):
+        transaction_key = json.dumps(record["dynamodb"]["Keys"], sort_keys=True)
+        if transaction_key not in latest or _sequence(record) > _sequence(latest[transaction_key]):
+            latest[transaction_key] = record
+
+    counts = {"applied": 0, "skipped": 0, "failed": 0}
+    failures = []
+    for record in sorted(latest.values(), key=_sequence):
+        try:
+            counts[apply_record(record)] += 1
+        except Exception as e:
+            counts["failed"] += 1
+            failures.append({"itemIdentifier": record["dynamodb"]["SequenceNumber"]})
+            instrumentation.log("ERROR", "Failed to apply stream record", error=str(e), sequenceNumber=record["dynamodb"]["SequenceNumber"])
+
+    instrumentation.log("INFO", "Processed stream batch", records=len(event.get("Records", [])), **counts)
+    return {"batchItemFailures": failures}
@@ -1,20 +1,121 @@
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
+import random
+import threading
+import time
+from UI.perf_metrics import add_trace_metadata
+from UI.stream_recording import RecordingClient, ReplayClient
+from UI.trace_index import TRACE_MODES, TraceIndex, summarize_trace
 
 logger = logging.getLogger(__name__)
 
+# Client settings - agent turns stream for minutes, so the read timeout is long; adaptive retries back off on throttling
+BEDROCK_REGION = os.environ.get("AWS_DEFAULT_REGION", "ap-southeast-2")
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.environ.get("BEDROCK_MAX_POOL_CONNECTIONS", "20"))
+BEDROCK_MAX_ATTEMPTS = int(os.environ.get("BEDROCK_MAX_ATTEMPTS", "4"))
+BEDROCK_CONNECT_TIMEOUT = int(os.environ.get("BEDROCK_CONNECT_TIMEOUT", "5"))
+BEDROCK_READ_TIMEOUT = int(os.environ.get("BEDROCK_READ_TIMEOUT", "300"))
+# Stream the final answer in chunks as it is generated instead of in one piece at the end of the turn
+BEDROCK_STREAM_FINAL_RESPONSE = os.environ.get("BEDROCK_STREAM_FINAL_RESPONSE", "true").lower() == "true"
+# off - no traces are requested; summary - only step metadata (rationale, invocation type, timings, token usage) is
+# kept of each trace; full - traces are kept whole, model prompts included
+BEDROCK_TRACE_MODE = os.environ.get("BEDROCK_TRACE_MODE", "full").lower()
+# Batch invocation - sessions in flight at once, and how often and how long a throttled turn is retried
+BEDROCK_BATCH_CONCURRENCY = int(os.environ.get("BEDROCK_BATCH_CONCURRENCY", "8"))
+BEDROCK_THROTTLE_RETRIES = int(os.environ.get("BEDROCK_THROTTLE_RETRIES", "6"))
+BEDROCK_THROTTLE_BASE_DELAY = float(os.environ.get("BEDROCK_THROTTLE_BASE_DELAY", "1.0"))
+BEDROCK_THROTTLE_MAX_DELAY = float(os.environ.get("BEDROCK_THROTTLE_MAX_DELAY", "30.0"))
+# Record every invocation's completion events to this JSON lines file, or replay them from one instead of calling
+# AWS (see stream_recording.py). Replay is instant unless BEDROCK_REPLAY_KEEP_TIMING keeps the recorded delays,
+# scaled down by BEDROCK_REPLAY_SPEED.
+BEDROCK_RECORD_PATH = os.environ.get("BEDROCK_RECORD_PATH")
+BEDROCK_REPLAY_PATH = os.environ.get("BEDROCK_REPLAY_PATH")
+BEDROCK_REPLAY_KEEP_TIMING = os.environ.get("BEDROCK_REPLAY_KEEP_TIMING", "false").lower() == "true"
+BEDROCK_REPLAY_SPEED = float(os.environ.get("BEDROCK_REPLAY_SPEED", "1.0"))
 
-def invoke_agent(agent_id, agent_alias_id, session_id, prompt):
+# Error codes worth retrying - the completion stream reports them in camel case (throttlingException)
+_RETRYABLE_CODES = {"throttlingexception", "toomanyrequestsexception", "servicequotaexceededexception",
+                    "serviceunavailableexception", "dependencyfailedexception", "internalserverexception"}
+
+# One client per (region, config) for the whole process. boto3 clients are thread safe but sessions are not, so
+# clients are created under the lock and then shared by every Streamlit script thread. Reusing them keeps the
+# resolved credentials, the endpoint and the pooled keep-alive connections between chat turns.
+# https://boto3.amazonaws.com/v1/documentation/api/latest/guide/clients.html#multithreading-or-multiprocessing-with-clients
+_session = None
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = boto3.Session()
+    return _session
+
+
+def get_client(region_name=None, **config_overrides):
+    region_name = region_name or BEDROCK_REGION
+    # Overrides may be dicts (retries, proxies), so the key holds their repr
+    key = (region_name, tuple(sorted((name, repr(value)) for name, value in config_overrides.items())))
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None and BEDROCK_REPLAY_PATH:
+                client = _clients[key] = ReplayClient(BEDROCK_REPLAY_PATH, BEDROCK_REPLAY_KEEP_TIMING, BEDROCK_REPLAY_SPEED)
+                logger.info(f"Replaying {len(client.recordings)} recorded invocations from {BEDROCK_REPLAY_PATH}")
+            if client is None:
+                settings = {
+                    "max_pool_connections": BEDROCK_MAX_POOL_CONNECTIONS,
+                    "tcp_keepalive": True,
+                    "connect_timeout": BEDROCK_CONNECT_TIMEOUT,
+                    "read_timeout": BEDROCK_READ_TIMEOUT,
+                    "retries": {"mode": "adaptive", "max_attempts": BEDROCK_MAX_ATTEMPTS},
+                }
+                settings.update(config_overrides)
+                client = _get_session().client(
+                    service_name="bedrock-agent-runtime",
+                    region_name=region_name,
+                    config=Config(**settings)
+                )
+                if BEDROCK_RECORD_PATH:
+                    client = RecordingClient(client, BEDROCK_RECORD_PATH)
+                    logger.info(f"Recording invocations to {BEDROCK_RECORD_PATH}")
+                _clients[key] = client
+                logger.info(f"Created bedrock-agent-runtime client for {region_name}")
+    return client
+
+
+# Create the client and resolve the credentials once at server start instead of on the first chat turn
+def warm_up(region_name=None):
+    client = get_client(region_name)
+    if BEDROCK_REPLAY_PATH:
+        return client
+    with _clients_lock:
+        credentials = _get_session().get_credentials()
+    if credentials is None:
+        logger.warning("No AWS credentials found - agent calls will fail until they are configured")
+    else:
+        credentials.get_frozen_credentials()
+    return client
+
+
+# Events of one agent turn as they arrive from the completion stream:
+#   {"type": "chunk", "text": ...}
+#   {"type": "citations", "citations": [...]}
+#   {"type": "trace", "traceType": ..., "trace": {...}}
+#   {"type": "metrics", "metrics": {...}} - last, with the stream timings and the trace metadata totals of the turn
+def invoke_agent_stream(agent_id, agent_alias_id, session_id, prompt, trace_mode=None, client=None, session_attributes=None):
+    trace_mode = (trace_mode or BEDROCK_TRACE_MODE).lower()
+    if trace_mode not in TRACE_MODES:
+        raise ValueError(f"trace_mode must be one of {', '.join(TRACE_MODES)}")
     try:
-        # Create client with explicit region configuration
-        session = boto3.Session()
-        client = session.client(
-            service_name="bedrock-agent-runtime",
-            region_name=os.environ.get("AWS_DEFAULT_REGION", "ap-southeast-2")
-        )
-        
+        client = client or get_client()
+
         # Use environment variables or fallback to hardcoded values
         actual_agent_id = agent_id or os.environ.get("BEDROCK_AGENT_ID", "F95VFQLKN0")
         actual_agent_alias_id = agent_alias_id or os.environ.get("BEDROCK_AGENT_ALIAS_ID", "S5KM0MEAKF")
@@ -22,29 +123,38 @@ def invoke_agent(agent_id, agent_alias_id, session_id, prompt):
         logger.info(f"Invoking agent {actual_agent_id} with alias {actual_agent_alias_id}")
         
         # See https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/bedrock-agent-runtime/client/invoke_agent.html
-        response = client.invoke_agent(
-            agentId='F95VFQLKN0', #actual_agent_id,
-            agentAliasId='S5KM0MEAKF', #actual_agent_alias_id,
-            enableTrace=True,
-            sessionId=session_id,
-            inputText=prompt
-        )
-
-        output_text = ""
-        citations = []
-        trace = {}
+        kwargs = {
+            "agentId": actual_agent_id,
+            "agentAliasId": actual_agent_alias_id,
+            "enableTrace": trace_mode != "off",
+            "sessionId": session_id,
+            "inputText": prompt
+        }
+        # Read by the action group Lambda - clientId scopes its reads to one client
+        if session_attributes:
+            kwargs["sessionState"] = {"sessionAttributes": session_attributes}
+        # Without streamFinalResponse the answer arrives as one chunk at the end of the turn. Older botocore
+        # versions do not know the parameter, so it is only sent when the service model has it.
+        if BEDROCK_STREAM_FINAL_RESPONSE and _supports_streaming(client):
+            kwargs["streamingConfigurations"] = {"streamFinalResponse": True}
+        started = time.perf_counter()
+        response = client.invoke_agent(**kwargs)
 
+        metrics = {}
         has_guardrail_trace = False
         for event in response.get("completion"):
-            # Combine the chunks to get the output text
+            if "first_event_ms" not in metrics:
+                metrics["first_event_ms"] = (time.perf_counter() - started) * 1000
             if "chunk" in event:
+                if "first_chunk_ms" not in metrics:
+                    metrics["first_chunk_ms"] = (time.perf_counter() - started) * 1000
                 chunk = event["chunk"]
-                output_text += chunk["bytes"].decode()
+                yield {"type": "chunk", "text": chunk.get("bytes", b"").decode()}
                 if "attribution" in chunk:
-                    citations += chunk["attribution"]["citations"]
+                    yield {"type": "citations", "citations": chunk["attribution"]["citations"]}
 
             # Extract trace information from all events
-            if "trace" in event:
+            if "trace" in event and trace_mode != "off":
                 for trace_type in ["guardrailTrace", "preProcessingTrace", "orchestrationTrace", "postProcessingTrace"]:
                     if trace_type in event["trace"]["trace"]:
                         mapped_trace_type = trace_type
@@ -54,15 +164,137 @@ def invoke_agent(agent_id, agent_alias_id, session_id, prompt):
                                 mapped_trace_type = "preGuardrailTrace"
                             else:
                                 mapped_trace_type = "postGuardrailTrace"
-                        if trace_type not in trace:
-                            trace[mapped_trace_type] = []
-                        trace[mapped_trace_type].append(event["trace"]["trace"][trace_type])
+                        trace = event["trace"]["trace"][trace_type]
+                        add_trace_metadata(metrics, mapped_trace_type, trace)
+                        yield {
+                            "type": "trace",
+                            "traceType": mapped_trace_type,
+                            "trace": summarize_trace(trace) if trace_mode == "summary" else trace
+                        }
+
+        metrics["total_ms"] = (time.perf_counter() - started) * 1000
+        accounted = sum(metrics.get(name, 0.0) for name in ("model_ms", "action_group_ms", "knowledge_base_ms", "guardrail_ms"))
+        metrics["orchestration_ms"] = max(metrics["total_ms"] - accounted, 0.0)
+        yield {"type": "metrics", "metrics": metrics}
 
     except ClientError as e:
         raise
 
+
+def _supports_streaming(client):
+    # A replay client has no service model - it serves the events as they were recorded
+    if client.meta is None:
+        return False
+    return "streamingConfigurations" in client.meta.service_model.operation_model("InvokeAgent").input_shape.members
+
+
+def new_result():
     return {
-        "output_text": output_text,
-        "citations": citations,
-        "trace": trace
+        "output_text": "",
+        "citations": [],
+        "trace": {},
+        "trace_index": TraceIndex(),
+        "metrics": {}
     }
+
+
+# Yield the text of the chunk events as they arrive and collect everything into result - the same result
+# invoke_agent returns once the stream is exhausted
+def stream_text(events, result):
+    parts = []
+    for event in events:
+        if event["type"] == "chunk":
+            parts.append(event["text"])
+            yield event["text"]
+        elif event["type"] == "citations":
+            result["citations"] += event["citations"]
+        elif event["type"] == "trace":
+            result["trace"].setdefault(event["traceType"], []).append(event["trace"])
+            result["trace_index"].add(event["traceType"], event["trace"])
+        elif event["type"] == "metrics":
+            result["metrics"] = event["metrics"]
+    result["output_text"] = "".join(parts)
+
+
+def invoke_agent(agent_id, agent_alias_id, session_id, prompt, trace_mode=None):
+    result = new_result()
+    for _ in stream_text(invoke_agent_stream(agent_id, agent_alias_id, session_id, prompt, trace_mode), result):
+        pass
+    return result
+
+
+def _is_retryable(error):
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code", "").lower() in _RETRYABLE_CODES
+
+
+# Run many (session_id, prompt) turns concurrently on a bounded thread pool and return one record per turn, in the
+# order given. Turns of the same session run one after the other in their given order, since an agent session
+# takes one turn at a time; different sessions run in parallel, up to concurrency at once.
+# A throttled turn is retried with full-jitter exponential backoff, and every worker holds off starting new turns
+# until the backoff of the latest throttled turn has passed, so the whole batch slows down instead of hammering
+# the quota. on_result(position, record) is called from the worker threads as soon as a turn completes.
+def invoke_agent_batch(turns, agent_id=None, agent_alias_id=None, concurrency=None, trace_mode="off", on_result=None):
+    concurrency = concurrency or BEDROCK_BATCH_CONCURRENCY
+    client = get_client(max_pool_connections=max(concurrency, BEDROCK_MAX_POOL_CONNECTIONS))
+    turns = list(turns)
+    records = [None] * len(turns)
+    sessions = {}
+    for position, (session_id, prompt) in enumerate(turns):
+        sessions.setdefault(session_id, []).append((position, prompt))
+
+    lock = threading.Lock()
+    resume_at = [0.0]
+
+    def wait_for_quota():
+        while True:
+            with lock:
+                delay = resume_at[0] - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def run_turn(session_id, prompt):
+        record = {"session_id": session_id, "prompt": prompt, "attempts": 0, "error": None}
+        for attempt in range(BEDROCK_THROTTLE_RETRIES + 1):
+            wait_for_quota()
+            record["attempts"] = attempt + 1
+            result = new_result()
+            started = time.perf_counter()
+            try:
+                for _ in stream_text(invoke_agent_stream(agent_id, agent_alias_id, session_id, prompt, trace_mode, client), result):
+                    pass
+            except ClientError as e:
+                if _is_retryable(e) and attempt < BEDROCK_THROTTLE_RETRIES:
+                    delay = random.uniform(0, min(BEDROCK_THROTTLE_MAX_DELAY, BEDROCK_THROTTLE_BASE_DELAY * 2 ** attempt))
+                    logger.warning(f"Turn of session {session_id} throttled ({e.response['Error']['Code']}), retrying in {delay:.1f}s")
+                    with lock:
+                        resume_at[0] = max(resume_at[0], time.monotonic() + delay)
+                    continue
+                record["error"] = f"{e.response.get('Error', {}).get('Code')}: {e}"
+                record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                return record
+            record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            first_chunk_ms = result["metrics"].get("first_chunk_ms")
+            record["first_chunk_ms"] = round(first_chunk_ms, 1) if first_chunk_ms is not None else None
+            record["output_text"] = result["output_text"]
+            record["citations"] = result["citations"]
+            record["metrics"] = {name: round(value, 1) for name, value in result["metrics"].items()}
+            if trace_mode != "off":
+                record["trace"] = result["trace"]
+            return record
+
+    def run_session(session_id, session_turns):
+        for position, prompt in session_turns:
+            try:
+                record = run_turn(session_id, prompt)
+            except Exception as e:
+                logger.exception(f"Turn of session {session_id} failed")
+                record = {"session_id": session_id, "prompt": prompt, "error": f"{type(e).__name__}: {e}"}
+            records[position] = record
+            if on_result is not None:
+                on_result(position, record)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(run_session, session_id, session_turns) for session_id, session_turns in sessions.items()]:
+            future.result()
+    return records
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Turns kept for the percentiles - the window is shared by every session of the server process
+PERF_METRICS_WINDOW = int(os.environ.get("PERF_METRICS_WINDOW", "500"))
+# Optional exports - every turn is appended to the JSON lines file, and the Prometheus text file is rewritten
+# after every turn (for the node_exporter textfile collector)
+PERF_METRICS_JSONL_PATH = os.environ.get("PERF_METRICS_JSONL_PATH")
+PERF_METRICS_PROMETHEUS_PATH = os.environ.get("PERF_METRICS_PROMETHEUS_PATH")
+
+# Figures of one turn, in the order they are shown - (name, description)
+TURN_METRICS = [
+    ("first_event_ms", "Time from the request to the first event of the completion stream"),
+    ("first_chunk_ms", "Time from the request to the first chunk of the answer"),
+    ("total_ms", "Time from the request to the end of the completion stream"),
+    ("model_ms", "Model invocation time reported in the trace metadata"),
+    ("action_group_ms", "Action group Lambda time reported in the trace metadata"),
+    ("knowledge_base_ms", "Knowledge base retrieval time reported in the trace metadata"),
+    ("guardrail_ms", "Guardrail time reported in the trace metadata"),
+    ("orchestration_ms", "Stream time not accounted for by the model, action group, knowledge base or guardrail"),
+    ("render_ms", "Time to format and render the answer in the UI after the stream ended"),
+    ("model_calls", "Model invocations in the turn"),
+    ("input_tokens", "Model input tokens of the turn"),
+    ("output_tokens", "Model output tokens of the turn"),
+]
+_PERCENTILES = [50, 95, 99]
+
+
+def percentile(values, rank):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round((len(ordered) - 1) * rank / 100)))]
+
+
+def _duration_ms(metadata):
+    if not isinstance(metadata, dict):
+        return 0.0
+    if metadata.get("totalTimeMs") is not None:
+        return float(metadata["totalTimeMs"])
+    start, end = metadata.get("startTime"), metadata.get("endTime")
+    if hasattr(start, "timestamp") and hasattr(end, "timestamp"):
+        return (end.timestamp() - start.timestamp()) * 1000
+    return 0.0
+
+
+# Add the timings and token usage found in the metadata of one raw trace to totals
+def add_trace_metadata(totals, trace_type, trace):
+    if trace_type.endswith("GuardrailTrace") or trace_type == "guardrailTrace":
+        totals["guardrail_ms"] = totals.get("guardrail_ms", 0.0) + _duration_ms(trace.get("metadata"))
+        return
+    output = trace.get("modelInvocationOutput")
+    if isinstance(output, dict):
+        metadata = output.get("metadata") or {}
+        usage = metadata.get("usage") or {}
+        totals["model_calls"] = totals.get("model_calls", 0) + 1
+        totals["input_tokens"] = totals.get("input_tokens", 0) + (usage.get("inputTokens") or 0)
+        totals["output_tokens"] = totals.get("output_tokens", 0) + (usage.get("outputTokens") or 0)
+        totals["model_ms"] = totals.get("model_ms", 0.0) + _duration_ms(metadata)
+    observation = trace.get("observation")
+    if isinstance(observation, dict):
+        for output_name, name in (("actionGroupInvocationOutput", "action_group_ms"), ("knowledgeBaseLookupOutput", "knowledge_base_ms")):
+            if isinstance(observation.get(output_name), dict):
+                totals[name] = totals.get(name, 0.0) + _duration_ms(observation[output_name].get("metadata"))
+
+
+# Rolling window of turn metrics, thread safe - Streamlit runs every session's script in its own thread
+class MetricsStore:
+    def __init__(self, window=PERF_METRICS_WINDOW, jsonl_path=PERF_METRICS_JSONL_PATH, prometheus_path=PERF_METRICS_PROMETHEUS_PATH):
+        self._turns = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        # Turns recorded, and the turn whose snapshot the Prometheus file holds
+        self._recorded = 0
+        self._exported = 0
+        # Cumulative count and sum per metric since the process started, for the Prometheus summaries
+        self._count = {}
+        self._sum = {}
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+
+    def record(self, metrics, session_id=None):
+        turn = {"time": time.time(), "session_id": session_id}
+        turn.update({name: round(value, 1) if isinstance(value, float) else value for name, value in metrics.items() if value is not None})
+        # Only the in-memory update and the snapshot of the export hold the lock - the files are written outside it,
+        # so a slow disk does not hold up the other sessions' turns or the Performance sidebar
+        with self._lock:
+            self._turns.append(turn)
+            for name, _ in TURN_METRICS:
+                if name in turn:
+                    self._count[name] = self._count.get(name, 0) + 1
+                    self._sum[name] = self._sum.get(name, 0) + turn[name]
+            self._recorded += 1
+            sequence = self._recorded
+            text = self._prometheus() if self.prometheus_path else None
+        self._export(turn, sequence, text)
+        return turn
+
+    # Writers take turns on the files; a snapshot older than the one already written is not written over it
+    def _export(self, turn, sequence, text):
+        if not self.jsonl_path and text is None:
+            return
+        with self._export_lock:
+            try:
+                if self.jsonl_path:
+                    with open(self.jsonl_path, "a", encoding="utf-8") as file:
+                        file.write(json.dumps(turn) + "\n")
+                if text is not None and sequence > self._exported:
+                    with open(self.prometheus_path + ".tmp", "w", encoding="utf-8") as file:
+                        file.write(text)
+                    os.replace(self.prometheus_path + ".tmp", self.prometheus_path)
+                    self._exported = sequence
+            except OSError as e:
+                logger.warning(f"Could not export the turn metrics: {e}")
+
+    def values(self, name, session_id=None):
+        with self._lock:
+            return [turn[name] for turn in self._turns if name in turn and (session_id is None or turn["session_id"] == session_id)]
+
+    # p50/p95 of every metric for one session and for the whole process - rows for the Performance sidebar
+    def table(self, session_id):
+        rows = []
+        for name, _ in TURN_METRICS:
+            session_values = self.values(name, session_id)
+            process_values = self.values(name)
+            if not process_values:
+                continue
+            rows.append({
+                "Metric": name,
+                "Session p50": percentile(session_values, 50),
+                "Session p95": percentile(session_values, 95),
+                "Process p50": percentile(process_values, 50),
+                "Process p95": percentile(process_values, 95),
+            })
+        return rows
+
+    # Prometheus text exposition format - one summary per metric, quantiles over the window
+    # https://prometheus.io/docs/instrumenting/exposition_formats/
+    def to_prometheus(self):
+        with self._lock:
+            return self._prometheus()
+
+    def _prometheus(self):
+        lines = []
+        for name, description in TURN_METRICS:
+            if name not in self._count:
+                continue
+            metric = f"bedrock_agent_turn_{name}"
+            values = [turn[name] for turn in self._turns if name in turn]
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} summary")
+            for rank in _PERCENTILES:
+                lines.append(f'{metric}{{quantile="{rank / 100}"}} {percentile(values, rank)}')
+            lines.append(f"{metric}_sum {self._sum[name]}")
+            lines.append(f"{metric}_count {self._count[name]}")
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self):
+        with self._lock:
+            return "".join(json.dumps(turn) + "\n" for turn in self._turns)
+
+
+# Process-wide store
+store = MetricsStore()
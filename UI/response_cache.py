@@ -0,0 +1,170 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from UI.trace_index import TraceIndex, summarize_trace
+
+logger = logging.getLogger(__name__)
+
+# Opt-in - a cached answer is not sent to the agent, so the agent session does not see that turn
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "900"))
+# Set to a file path to keep answers across server restarts and share them between server processes
+RESPONSE_CACHE_SQLITE_PATH = os.environ.get("RESPONSE_CACHE_SQLITE_PATH")
+
+# The version counters kept by the transactions writers (see MyobbSilverFinActionGroup/result_cache.py). Answers
+# are keyed with the client's counter, so they stop being served as soon as the client's transactions change.
+VERSION_TABLE_NAME = os.environ.get("VERSION_TABLE_NAME", "hack-aranda-myobb-silverfine-versions")
+ALL_CLIENTS = "*"
+
+_PUNCTUATION = re.compile(r"[\s?.!]+$")
+_version_client = None
+_version_table_missing = False
+
+
+# Prompts that differ only in case, spacing or trailing punctuation are the same question
+def normalize_prompt(prompt):
+    return _PUNCTUATION.sub("", " ".join(str(prompt).lower().split()))
+
+
+def make_key(agent_id, agent_alias_id, prompt, client_id, data_version):
+    parts = [agent_id, agent_alias_id, normalize_prompt(prompt), client_id or ALL_CLIENTS, data_version]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+# Version counter of the client's transactions - None when it cannot be read, and then only the TTL applies
+# https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/dynamodb/client/get_item.html
+def get_data_version(client_id=None):
+    global _version_client, _version_table_missing
+    if _version_table_missing or not VERSION_TABLE_NAME:
+        return None
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+
+    try:
+        if _version_client is None:
+            _version_client = boto3.client(
+                "dynamodb",
+                region_name=os.environ.get("AWS_DEFAULT_REGION", "ap-southeast-2"),
+                config=Config(connect_timeout=2, read_timeout=2, retries={"mode": "standard", "max_attempts": 2})
+            )
+        response = _version_client.get_item(
+            TableName=VERSION_TABLE_NAME,
+            Key={"clientId": {"S": client_id or ALL_CLIENTS}},
+            ProjectionExpression="version"
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("ResourceNotFoundException", "AccessDeniedException"):
+            logger.warning(f"Version table {VERSION_TABLE_NAME} cannot be read - cached answers expire by TTL only")
+            _version_table_missing = True
+        return None
+    except NoCredentialsError:
+        logger.warning("No AWS credentials to read the data version - cached answers expire by TTL only")
+        _version_table_missing = True
+        return None
+    except BotoCoreError as e:
+        logger.warning(f"Could not read the data version: {e}")
+        return None
+    item = response.get("Item")
+    return item["version"]["N"] if item else "0"
+
+
+# The part of an agent result worth keeping - the answer, its citations and the trace summary
+def to_entry(result):
+    return {
+        "output_text": result["output_text"],
+        "citations": result["citations"],
+        "trace": {
+            trace_type: [summarize_trace(trace) for trace in traces]
+            for trace_type, traces in result["trace"].items()
+        }
+    }
+
+
+def from_entry(entry):
+    trace_index = TraceIndex()
+    for trace_type, traces in entry["trace"].items():
+        for trace in traces:
+            trace_index.add(trace_type, trace)
+    return {
+        "output_text": entry["output_text"],
+        "citations": entry["citations"],
+        "trace": entry["trace"],
+        "trace_index": trace_index,
+        "cached": True
+    }
+
+
+# LRU with a TTL in memory, in front of an optional SQLite file. Shared by every session of the server process,
+# so every method takes the lock.
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+                 sqlite_path=RESPONSE_CACHE_SQLITE_PATH):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, entry TEXT NOT NULL, stored_at REAL NOT NULL)")
+            self._db.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - ttl_seconds,))
+            self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.time() - entry["stored_at"] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    return from_entry(entry)
+                del self._entries[key]
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT entry, stored_at FROM responses WHERE key = ? AND stored_at >= ?",
+                (key, time.time() - self.ttl_seconds)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = dict(json.loads(row[0]), stored_at=row[1])
+            self._remember(key, entry)
+            return from_entry(entry)
+
+    def put(self, key, result):
+        entry = dict(to_entry(result), stored_at=time.time())
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                stored = {name: value for name, value in entry.items() if name != "stored_at"}
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, entry, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(stored, default=str), entry["stored_at"])
+                )
+                self._db.commit()
+
+    def _remember(self, key, entry):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def __len__(self):
+        return len(self._entries)
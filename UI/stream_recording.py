@@ -0,0 +1,147 @@
+import base64
+import datetime
+import itertools
+import json
+import logging
+import threading
+import time
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# Every recording client of the process appends to the file under this lock, so lines never interleave
+_write_lock = threading.Lock()
+
+# One JSON line per invocation - the request, how long the call took to return, and every raw completion event
+# with the gap since the previous one:
+#   {"agentId": ..., "agentAliasId": ..., "sessionId": ..., "inputText": ..., "recordedAt": ..., "requestMs": 812.3,
+#    "events": [{"gapMs": 1520.4, "event": {"trace": {...}}}, {"gapMs": 35.2, "event": {"chunk": {"bytes": {"$bytes": "SGVsbG8="}}}},
+#               {"gapMs": 3.1, "error": {"Code": "throttlingException", "Message": "..."}}]}
+# Chunk bytes are base64 and trace timestamps ISO 8601, so the file is plain JSON.
+
+
+def _encode(value):
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, (bytes, bytearray)):
+        return {"$bytes": base64.b64encode(value).decode()}
+    if isinstance(value, datetime.datetime):
+        return {"$datetime": value.isoformat()}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if len(value) == 1 and "$bytes" in value:
+            return base64.b64decode(value["$bytes"])
+        if len(value) == 1 and "$datetime" in value:
+            return datetime.datetime.fromisoformat(value["$datetime"])
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+def read_recordings(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+# Wraps a bedrock-agent-runtime client and appends every invocation to path as the caller reads its stream.
+# The line is written when the stream ends, fails or is abandoned.
+class RecordingClient:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self.meta = client.meta
+
+    def invoke_agent(self, **kwargs):
+        recording = {
+            "agentId": kwargs.get("agentId"),
+            "agentAliasId": kwargs.get("agentAliasId"),
+            "sessionId": kwargs.get("sessionId"),
+            "inputText": kwargs.get("inputText"),
+            "recordedAt": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "events": []
+        }
+        started = time.perf_counter()
+        response = self._client.invoke_agent(**kwargs)
+        recording["requestMs"] = round((time.perf_counter() - started) * 1000, 1)
+        return dict(response, completion=self._record(response["completion"], recording))
+
+    def _record(self, completion, recording):
+        last = time.perf_counter()
+        try:
+            for event in completion:
+                now = time.perf_counter()
+                recording["events"].append({"gapMs": round((now - last) * 1000, 1), "event": _encode(event)})
+                yield event
+                last = time.perf_counter()
+        except ClientError as e:
+            error = e.response.get("Error", {})
+            recording["events"].append({
+                "gapMs": round((time.perf_counter() - last) * 1000, 1),
+                "error": {"Code": error.get("Code"), "Message": error.get("Message")}
+            })
+            raise
+        finally:
+            self._write(recording)
+
+    def _write(self, recording):
+        line = json.dumps(recording, default=str) + "\n"
+        with _write_lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(line)
+            except OSError as e:
+                logger.warning(f"Could not record the invocation: {e}")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+# Stands in for the bedrock-agent-runtime client by serving recorded invocations - no network or credentials.
+# An invocation gets the next recording of the same prompt (ignoring case and spacing), or the next recording of
+# any prompt when none matches. With keep_timing the recorded request time and gaps between events are slept,
+# divided by speed.
+class ReplayClient:
+    meta = None
+
+    def __init__(self, recordings, keep_timing=False, speed=1.0):
+        if isinstance(recordings, str):
+            recordings = read_recordings(recordings)
+        if not recordings:
+            raise ValueError("no recordings to replay")
+        self.recordings = recordings
+        self.keep_timing = keep_timing
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._all = itertools.cycle(recordings)
+        by_prompt = {}
+        for recording in recordings:
+            by_prompt.setdefault(self._prompt_key(recording.get("inputText")), []).append(recording)
+        self._by_prompt = {prompt: itertools.cycle(matches) for prompt, matches in by_prompt.items()}
+
+    @staticmethod
+    def _prompt_key(prompt):
+        return " ".join(str(prompt or "").lower().split())
+
+    def invoke_agent(self, **kwargs):
+        with self._lock:
+            matches = self._by_prompt.get(self._prompt_key(kwargs.get("inputText")))
+            recording = next(matches if matches is not None else self._all)
+        self._sleep(recording.get("requestMs", 0))
+        return {"completion": self._replay(recording), "sessionId": kwargs.get("sessionId")}
+
+    def _replay(self, recording):
+        for entry in recording["events"]:
+            self._sleep(entry.get("gapMs", 0))
+            if "error" in entry:
+                raise ClientError({"Error": entry["error"]}, "InvokeAgent")
+            yield _decode(entry["event"])
+
+    def _sleep(self, milliseconds):
+        if self.keep_timing and milliseconds:
+            time.sleep(milliseconds / 1000 / self.speed)
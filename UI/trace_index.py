@@ -0,0 +1,108 @@
+import json
+
+# Trace types shown under each phase of the Trace sidebar, in display order
+trace_types_map = {
+    "Pre-Processing": ["preGuardrailTrace", "preProcessingTrace"],
+    "Orchestration": ["orchestrationTrace"],
+    "Post-Processing": ["postProcessingTrace", "postGuardrailTrace"]
+}
+
+# Parts of a trace that carry its traceId - the first one found groups the trace into a step
+trace_info_types_map = {
+    "preProcessingTrace": ["modelInvocationInput", "modelInvocationOutput"],
+    "orchestrationTrace": ["invocationInput", "modelInvocationInput", "modelInvocationOutput", "observation", "rationale"],
+    "postProcessingTrace": ["modelInvocationInput", "modelInvocationOutput", "observation"]
+}
+
+TRACE_MODES = ["off", "summary", "full"]
+
+# What summary mode keeps of each part of a trace - step metadata without the prompts, raw model responses and
+# action group outputs. None keeps the value as it is.
+_metadata = {"usage": None, "startTime": None, "endTime": None, "totalTimeMs": None, "clientRequestId": None}
+trace_summary_spec = {
+    "traceId": None,
+    "action": None,
+    "metadata": _metadata,
+    "modelInvocationInput": {"traceId": None, "type": None, "foundationModel": None},
+    "modelInvocationOutput": {"traceId": None, "metadata": _metadata, "parsedResponse": {"isValid": None}},
+    "rationale": {"traceId": None, "text": None},
+    "invocationInput": {
+        "traceId": None,
+        "invocationType": None,
+        "actionGroupInvocationInput": {"actionGroupName": None, "apiPath": None, "verb": None, "function": None},
+        "knowledgeBaseLookupInput": {"knowledgeBaseId": None},
+        "agentCollaboratorInvocationInput": {"agentCollaboratorName": None}
+    },
+    "observation": {"traceId": None, "type": None, "metadata": _metadata},
+}
+
+
+def _pick(value, spec):
+    if spec is None or not isinstance(value, dict):
+        return value
+    return {key: _pick(value[key], spec[key]) for key in spec if key in value}
+
+
+def summarize_trace(trace):
+    return _pick(trace, trace_summary_spec)
+
+
+class TraceStep:
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.number = None
+        self.traces = []
+        self._json = None
+
+    # Pretty-printed once, then reused by every rerun of the sidebar
+    @property
+    def json(self):
+        if self._json is None or len(self._json) != len(self.traces):
+            self._json = [json.dumps(trace, indent=2, default=str) for trace in self.traces]
+        return self._json
+
+
+# Traces of one agent turn grouped into steps by trace type and traceId, the way the Bedrock console shows them.
+# Filled while the event stream is read, so rendering the sidebar only walks the steps.
+class TraceIndex:
+    def __init__(self):
+        self.steps_by_type = {trace_type: {} for trace_types in trace_types_map.values() for trace_type in trace_types}
+        self._numbered = True
+
+    def add(self, trace_type, trace):
+        steps = self.steps_by_type.setdefault(trace_type, {})
+        info_types = trace_info_types_map.get(trace_type)
+        if info_types is None:
+            # Guardrail traces carry the traceId themselves, one step each
+            step = steps[trace["traceId"]] = TraceStep(trace["traceId"])
+            step.traces.append({trace_type: trace})
+        else:
+            for info_type in info_types:
+                if info_type in trace:
+                    trace_id = trace[info_type]["traceId"]
+                    step = steps.get(trace_id)
+                    if step is None:
+                        step = steps[trace_id] = TraceStep(trace_id)
+                    step.traces.append(trace)
+                    break
+            else:
+                return
+        self._numbered = False
+
+    # Steps are numbered across the phases in display order
+    def _number(self):
+        number = 1
+        for trace_types in trace_types_map.values():
+            for trace_type in trace_types:
+                for step in self.steps_by_type[trace_type].values():
+                    step.number = number
+                    number += 1
+        self._numbered = True
+
+    def phase_steps(self, phase):
+        if not self._numbered:
+            self._number()
+        return [step for trace_type in trace_types_map[phase] for step in self.steps_by_type[trace_type].values()]
+
+    def __len__(self):
+        return sum(len(steps) for steps in self.steps_by_type.values())
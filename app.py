@@ -1,4 +1,5 @@
 from dotenv import load_dotenv
+import itertools
 import json
 import logging
 import logging.config
@@ -6,7 +7,11 @@ import os
 import pandas as pd
 import re
 from UI import bedrock_agent_runtime
+from UI import perf_metrics
+from UI import response_cache
+from UI.trace_index import TRACE_MODES, TraceIndex, trace_types_map
 import streamlit as st
+import time
 import uuid
 import yaml
 
@@ -35,6 +40,24 @@ agent_id = os.environ.get("BEDROCK_AGENT_ID", 'F95VFQLKN0')
 agent_alias_id = os.environ.get("BEDROCK_AGENT_ALIAS_ID", "S5KM0MEAKF")  # TSTALIASID is the default test alias ID
 ui_title = os.environ.get("BEDROCK_AGENT_TEST_UI_TITLE", "Welcome to Accura Agent")
 ui_icon = os.environ.get("BEDROCK_AGENT_TEST_UI_ICON")
+# Transactions client of the session, sent to the agent as the clientId session attribute
+client_id = os.environ.get("CLIENT_ID")
+
+
+# Answers shared by every session of the server process, when RESPONSE_CACHE_ENABLED is set
+@st.cache_resource
+def get_response_cache():
+    return response_cache.ResponseCache()
+
+
+# Runs once per server process - the first chat turn then finds the client and credentials ready
+@st.cache_resource
+def warm_up_bedrock_client():
+    try:
+        return bedrock_agent_runtime.warm_up()
+    except Exception as e:
+        logger.warning(f"Bedrock client warm-up failed: {e}")
+        return None
 
 
 def init_session_state():
@@ -42,6 +65,7 @@ def init_session_state():
     st.session_state.messages = []
     st.session_state.citations = []
     st.session_state.trace = {}
+    st.session_state.trace_index = TraceIndex()
     st.session_state.uploaded_documents = [
         {"name": "Tax_Return_2023.pdf", "size": "2.3 MB", "status": "completed"},
         {"name": "Receipts_Folder.zip", "size": "4.1 MB", "status": "completed"}
@@ -51,7 +75,8 @@ def init_session_state():
         "date_of_birth": "01/01/1990",
         "tfn": "123 456 789",
         "address": "42 Collins Street, Melbourne VIC 3000",
-        "address_status": "needs_confirmation"
+        "address_status": "needs_confirmation",
+        "client_id": client_id
     }
     st.session_state.transaction_data = [
         {"date": "2025-03-15", "amount": 40123, "hasReceipt": False, "transactionName": "Motor vehicle expenses"},
@@ -523,6 +548,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 st.title(ui_title)
+warm_up_bedrock_client()
 if len(st.session_state.items()) == 0:
     init_session_state()
 
@@ -610,14 +636,41 @@ if prompt := st.chat_input():
 
     with st.chat_message("assistant"):
         with st.empty():
-            with st.spinner():
-                response = bedrock_agent_runtime.invoke_agent(
+            # The same question about the same client and unchanged data is answered from the cache. Without a
+            # client the agent may read any book, so the key falls back to the all-clients counter.
+            session_client_id = st.session_state.client_details.get("client_id")
+            response = None
+            if response_cache.RESPONSE_CACHE_ENABLED:
+                cache_key = response_cache.make_key(
                     agent_id,
                     agent_alias_id,
-                    st.session_state.session_id,
-                    prompt
+                    prompt,
+                    session_client_id,
+                    response_cache.get_data_version(session_client_id)
+                )
+                response = get_response_cache().get(cache_key)
+
+            if response is None:
+                # Text is shown as it arrives; the formatted answer below replaces it once the turn is complete
+                response = bedrock_agent_runtime.new_result()
+                text_chunks = bedrock_agent_runtime.stream_text(
+                    bedrock_agent_runtime.invoke_agent_stream(
+                        agent_id,
+                        agent_alias_id,
+                        st.session_state.session_id,
+                        prompt,
+                        st.session_state.get("trace_mode"),
+                        session_attributes={"clientId": session_client_id} if session_client_id else None
+                    ),
+                    response
                 )
+                with st.spinner():
+                    first_chunk = next(text_chunks, "")
+                st.write_stream(itertools.chain([first_chunk], text_chunks))
+                if response_cache.RESPONSE_CACHE_ENABLED and response["output_text"]:
+                    get_response_cache().put(cache_key, response)
             output_text = response["output_text"]
+            render_started = time.perf_counter()
 
             # Check if the output is a JSON object with the instruction and result fields
             try:
@@ -645,6 +698,7 @@ if prompt := st.chat_input():
             st.session_state.messages.append({"role": "assistant", "content": output_text})
             st.session_state.citations = response["citations"]
             st.session_state.trace = response["trace"]
+            st.session_state.trace_index = response["trace_index"]
             
             # Check if we should show the right panel
             st.session_state.show_right_panel = "motor vehicle" in output_text.lower()
@@ -652,61 +706,31 @@ if prompt := st.chat_input():
             # Display with consistent styling - clean text processing
             st.markdown(output_text, unsafe_allow_html=True)
 
-trace_types_map = {
-    "Pre-Processing": ["preGuardrailTrace", "preProcessingTrace"],
-    "Orchestration": ["orchestrationTrace"],
-    "Post-Processing": ["postProcessingTrace", "postGuardrailTrace"]
-}
+            # Cached answers did not reach Bedrock, so only live turns go into the latency figures
+            if not response.get("cached"):
+                perf_metrics.store.record(
+                    dict(response["metrics"], render_ms=(time.perf_counter() - render_started) * 1000),
+                    st.session_state.session_id
+                )
 
-trace_info_types_map = {
-    "preProcessingTrace": ["modelInvocationInput", "modelInvocationOutput"],
-    "orchestrationTrace": ["invocationInput", "modelInvocationInput", "modelInvocationOutput", "observation", "rationale"],
-    "postProcessingTrace": ["modelInvocationInput", "modelInvocationOutput", "observation"]
-}
-# Sidebar section for trace
+# Sidebar section for trace - rendered from the index built while the answer streamed in
 with st.sidebar:
     st.title("Trace")
 
-    # Show each trace type in separate sections
-    step_num = 1
+    # Applies from the next question - full keeps the model prompts of every step, off does not request traces
+    if "trace_mode" not in st.session_state:
+        st.session_state.trace_mode = bedrock_agent_runtime.BEDROCK_TRACE_MODE
+    st.radio("Trace detail", TRACE_MODES, key="trace_mode", horizontal=True, format_func=str.capitalize)
+
+    # Show each trace type in separate sections, numbered by step like the Bedrock console
     for trace_type_header in trace_types_map:
         st.subheader(trace_type_header)
-
-        # Organize traces by step similar to how it is shown in the Bedrock console
-        has_trace = False
-        for trace_type in trace_types_map[trace_type_header]:
-            if trace_type in st.session_state.trace:
-                has_trace = True
-                trace_steps = {}
-
-                for trace in st.session_state.trace[trace_type]:
-                    # Each trace type and step may have different information for the end-to-end flow
-                    if trace_type in trace_info_types_map:
-                        trace_info_types = trace_info_types_map[trace_type]
-                        for trace_info_type in trace_info_types:
-                            if trace_info_type in trace:
-                                trace_id = trace[trace_info_type]["traceId"]
-                                if trace_id not in trace_steps:
-                                    trace_steps[trace_id] = [trace]
-                                else:
-                                    trace_steps[trace_id].append(trace)
-                                break
-                    else:
-                        trace_id = trace["traceId"]
-                        trace_steps[trace_id] = [
-                            {
-                                trace_type: trace
-                            }
-                        ]
-
-                # Show trace steps in JSON similar to the Bedrock console
-                for trace_id in trace_steps.keys():
-                    with st.expander(f"Trace Step {str(step_num)}", expanded=False):
-                        for trace in trace_steps[trace_id]:
-                            trace_str = json.dumps(trace, indent=2)
-                            st.code(trace_str, language="json", line_numbers=True, wrap_lines=True)
-                    step_num += 1
-        if not has_trace:
+        trace_steps = st.session_state.trace_index.phase_steps(trace_type_header)
+        for step in trace_steps:
+            with st.expander(f"Trace Step {str(step.number)}", expanded=False):
+                for trace_str in step.json:
+                    st.code(trace_str, language="json", line_numbers=True, wrap_lines=True)
+        if not trace_steps:
             st.text("None")
 
     st.subheader("Citations")
@@ -727,6 +751,20 @@ with st.sidebar:
     else:
         st.text("None")
 
+    # Latency of this session's turns against every turn of the server process (in ms, tokens per turn)
+    st.subheader("Performance")
+    performance_rows = perf_metrics.store.table(st.session_state.session_id)
+    if performance_rows:
+        st.dataframe(pd.DataFrame(performance_rows), hide_index=True, use_container_width=True)
+        st.download_button(
+            "Prometheus metrics",
+            perf_metrics.store.to_prometheus(),
+            file_name="bedrock_agent_turns.prom",
+            mime="text/plain"
+        )
+    else:
+        st.text("None")
+
 # Display right panel conditionally
 if hasattr(st.session_state, 'show_right_panel') and st.session_state.show_right_panel:
     # Create a container for the right panel using Streamlit components
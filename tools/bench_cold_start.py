@@ -0,0 +1,94 @@
+#1 imports - Import-time and first-invocation benchmark of the transactions action group Lambda
+#
+#   python tools/bench_cold_start.py --trials 10 --rows 2000
+#   python tools/bench_cold_start.py --endpoint-url http://localhost:8000   (DynamoDB Local, tables already loaded)
+#
+# Every trial runs in a fresh interpreter, like a new Lambda execution environment.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TaxReturnAgent", "MyobbSilverFinActionGroup")
+
+
+#2 One cold start, run inside the child interpreter
+def run_trial(rows, endpoint_url):
+    sys.path.insert(0, LAMBDA_DIR)
+
+    started = time.perf_counter()
+    import lambda_function
+    import_ms = (time.perf_counter() - started) * 1000
+
+    # Building the real client is part of the first call, whether or not it talks to the stand-in
+    started = time.perf_counter()
+    lambda_function.get_client()
+    client_ms = (time.perf_counter() - started) * 1000
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import synthetic_data
+    if not endpoint_url:
+        lambda_function.client = synthetic_data.seeded_stand_in(rows)
+
+    event = synthetic_data.agent_event()
+    started = time.perf_counter()
+    lambda_function.lambda_handler(event, None)
+    first_ms = (time.perf_counter() - started) * 1000 + client_ms
+
+    lambda_function.cache.clear()
+    started = time.perf_counter()
+    lambda_function.lambda_handler(event, None)
+    warm_ms = (time.perf_counter() - started) * 1000
+
+    return {"import_ms": import_ms, "client_ms": client_ms, "first_invocation_ms": first_ms, "warm_invocation_ms": warm_ms}
+
+
+#3 Parent - spawn the trials and report the medians
+def main():
+    parser = argparse.ArgumentParser(description="Import-time and first-invocation benchmark of the transactions Lambda")
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=2000, help="rows seeded into the in-memory stand-in")
+    parser.add_argument("--endpoint-url", help="use DynamoDB Local at this URL instead of the in-memory stand-in")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # The handler writes its metric lines to stdout, so the trial result goes out on stderr
+        sys.stderr.write(json.dumps(run_trial(args.rows, args.endpoint_url)) + "\n")
+        return
+
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "ap-southeast-2")
+    env.setdefault("AWS_ACCESS_KEY_ID", "local")
+    env.setdefault("AWS_SECRET_ACCESS_KEY", "local")
+    env["LOG_LEVEL"] = "WARNING"
+    if args.endpoint_url:
+        env["DYNAMODB_ENDPOINT_URL"] = args.endpoint_url
+
+    trials = []
+    for _ in range(args.trials):
+        command = [sys.executable, os.path.abspath(__file__), "--child", "--rows", str(args.rows)]
+        if args.endpoint_url:
+            command += ["--endpoint-url", args.endpoint_url]
+        completed = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+        trials.append(json.loads(completed.stderr.strip().splitlines()[-1]))
+
+    results = {
+        "trials": args.trials,
+        "rows": args.rows,
+        "backend": args.endpoint_url or "in-memory",
+        "median": {name: round(statistics.median(trial[name] for trial in trials), 2) for name in trials[0]},
+        "min": {name: round(min(trial[name] for trial in trials), 2) for name in trials[0]},
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#1 imports - Scale benchmark of the transactions action group Lambda against the in-memory DynamoDB stand-in
+#
+#   python tools/bench_transactions.py --output bench.json
+#   python tools/bench_transactions.py --sizes 1000,10000 --operations list,summary --compare bench.json
+#
+# Every (size, operation) runs in a fresh interpreter seeded with that many synthetic rows, so the peak RSS of
+# one operation is not hidden by another. The read cache is cleared before each timed call.
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.join(TOOLS_DIR, "..", "TaxReturnAgent", "MyobbSilverFinActionGroup")
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+# Operation name -> (apiPath, parameters)
+OPERATIONS = {
+    "list": ("/transactions", {}),
+    "list_columnar": ("/transactions", {"fields": "date,amount", "format": "columnar"}),
+    "summary": ("/transactions/summary", {}),
+    "anomalies": ("/transactions/anomalies", {"financialYear": "FY2025"}),
+    "reconciliation": ("/reconciliation", {}),
+    "unmatched_receipts": ("/transactions/unmatched-receipts", {}),
+}
+
+
+def _rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+#2 One operation at one size, run inside the child interpreter
+def run_operation(size, operation, iterations, max_seconds):
+    sys.path.insert(0, LAMBDA_DIR)
+    sys.path.insert(0, TOOLS_DIR)
+    import lambda_function
+    import synthetic_data
+    import transactions_reader
+    import transactions_summary
+
+    stand_in = synthetic_data.seeded_stand_in(size)
+    receipts = stand_in.create_table(transactions_reader.RECEIPT_TABLE_NAME, transactions_reader.PARTITION_KEY, "receiptId")
+    if operation == "unmatched_receipts":
+        import match_receipts
+        rows = list(synthetic_data.generate_transactions(size, client_id=synthetic_data.client_id_for(0)))
+        for record in match_receipts.synthetic_receipts(rows, max(size // 10, 1)):
+            receipts.put(match_receipts.to_receipt_item(synthetic_data.client_id_for(0), record))
+        del rows
+    lambda_function.client = stand_in
+    seeded_rss_mb = _rss_mb()
+
+    api_path, parameters = OPERATIONS[operation]
+    event = synthetic_data.agent_event(api_path, parameters=parameters)
+
+    latencies = []
+    read_units = requests = response_bytes = status = None
+    started_all = time.perf_counter()
+    while len(latencies) < iterations and (not latencies or time.perf_counter() - started_all < max_seconds):
+        lambda_function.cache.clear()
+        units_before = stand_in.consumed_read_units
+        requests_before = stand_in.request_count
+        started = time.perf_counter()
+        response = lambda_function.lambda_handler(event, None)["response"]
+        latencies.append((time.perf_counter() - started) * 1000)
+        read_units = stand_in.consumed_read_units - units_before
+        requests = stand_in.request_count - requests_before
+        response_bytes = len(response["responseBody"]["application/json"]["body"])
+        status = response["httpStatusCode"]
+
+    # One more call without clearing the cache - what a repeated question costs on a warm container
+    started = time.perf_counter()
+    lambda_function.lambda_handler(event, None)
+    cached_ms = (time.perf_counter() - started) * 1000
+
+    ordered = sorted(latencies)
+    return {
+        "size": size,
+        "operation": operation,
+        "status": status,
+        "iterations": len(latencies),
+        "latency_ms": {
+            "p50": round(transactions_summary.percentile(ordered, 50), 2),
+            "p90": round(transactions_summary.percentile(ordered, 90), 2),
+            "p99": round(transactions_summary.percentile(ordered, 99), 2),
+            "max": round(ordered[-1], 2),
+        },
+        "cached_ms": round(cached_ms, 2),
+        "response_bytes": response_bytes,
+        "read_units": read_units,
+        "requests": requests,
+        "seeded_rss_mb": seeded_rss_mb,
+        "peak_rss_mb": _rss_mb(),
+    }
+
+
+#3 Compare with an earlier results file - ratios above 1 are slower / bigger than the baseline
+def compare(results, baseline_path):
+    with open(baseline_path) as file:
+        baseline = {(entry["size"], entry["operation"]): entry for entry in json.load(file)["results"]}
+    rows = []
+    for entry in results:
+        before = baseline.get((entry["size"], entry["operation"]))
+        if before is None:
+            continue
+        rows.append({
+            "size": entry["size"],
+            "operation": entry["operation"],
+            "p50_ratio": round(entry["latency_ms"]["p50"] / max(before["latency_ms"]["p50"], 0.01), 2),
+            "peak_rss_ratio": round(entry["peak_rss_mb"] / max(before["peak_rss_mb"], 0.1), 2),
+            "response_bytes_ratio": round(entry["response_bytes"] / max(before["response_bytes"], 1), 2),
+            "read_units_ratio": round(entry["read_units"] / before["read_units"], 2) if before["read_units"] else None,
+        })
+    return rows
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=TOOLS_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+#4 Parent - one child per (size, operation), results as one JSON document
+def main():
+    parser = argparse.ArgumentParser(description="Scale benchmark of the transactions Lambda against the in-memory stand-in")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES), help="comma separated row counts")
+    parser.add_argument("--operations", default=",".join(OPERATIONS), help="comma separated, from: " + ", ".join(OPERATIONS))
+    parser.add_argument("--iterations", type=int, default=5, help="timed calls per operation")
+    parser.add_argument("--max-seconds", type=float, default=60, help="stop iterating an operation after this long (at least one call)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="results file of an earlier run to compare with")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--operation", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # The handler writes its metric lines to stdout, so the result goes out on stderr
+        sys.stderr.write(json.dumps(run_operation(args.size, args.operation, args.iterations, args.max_seconds)) + "\n")
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    operations = [operation for operation in args.operations.split(",") if operation]
+    unknown = set(operations) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"unknown operations: {', '.join(sorted(unknown))}")
+
+    env = dict(os.environ)
+    env["LOG_LEVEL"] = "WARNING"
+    results = []
+    for size in sizes:
+        for operation in operations:
+            command = [
+                sys.executable, os.path.abspath(__file__), "--child", "--size", str(size), "--operation", operation,
+                "--iterations", str(args.iterations), "--max-seconds", str(args.max_seconds)
+            ]
+            completed = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            if completed.returncode != 0:
+                raise SystemExit(f"{operation} at {size} rows failed:\n{completed.stderr}")
+            result = json.loads(completed.stderr.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{size:>9} {operation:<20} p50 {result['latency_ms']['p50']:>10.1f} ms  peak {result['peak_rss_mb']:>7.1f} MB  "
+                  f"{result['response_bytes']:>10} bytes  {result['read_units']:>9.1f} RCU", file=sys.stderr)
+
+    report = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "iterations": args.iterations,
+        "results": results,
+    }
+    if args.compare:
+        report["comparison"] = {"baseline": args.compare, "results": compare(results, args.compare)}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
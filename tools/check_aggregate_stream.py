@@ -0,0 +1,156 @@
+#1 imports - Feed synthetic DynamoDB Stream records through the aggregate stream Lambda and check the totals
+#
+#   python tools/check_aggregate_stream.py --transactions 2000 --updates 3000 --duplicates 0.2
+#
+# Records are delivered shuffled between batches and with duplicates, like retried and resharded streams,
+# against the in-memory stand-in. The materialized aggregates must match totals recomputed from the final table.
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(TOOLS_DIR, "..")
+sys.path.insert(0, TOOLS_DIR)
+
+import synthetic_data
+import deduction_categories
+import transactions_reader
+import transactions_summary
+import item_codec
+
+
+def load_stream_lambda():
+    path = os.path.join(ROOT_DIR, "TaxReturnAgent", "MyobbSilverFinAggregateStream", "lambda_function.py")
+    spec = importlib.util.spec_from_file_location("aggregate_stream_lambda", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+#2 Apply random inserts, modifies and removes to the table, emitting a stream record for each
+def generate_records(table, transactions, updates, seed):
+    generator = random.Random(seed)
+    rows = list(synthetic_data.generate_transactions(transactions, seed=seed))
+    categories = ["Motor vehicle expenses", "Work-related expenses", "Donations", None]
+    sequence = 10 ** 20
+    records = []
+
+    def emit(event_name, keys, old_image, new_image):
+        nonlocal sequence
+        sequence += generator.randrange(1, 1000)
+        dynamodb = {"Keys": keys, "SequenceNumber": str(sequence), "StreamViewType": "NEW_AND_OLD_IMAGES"}
+        if old_image:
+            dynamodb["OldImage"] = old_image
+        if new_image:
+            dynamodb["NewImage"] = new_image
+        records.append({"eventName": event_name, "eventSource": "aws:dynamodb", "dynamodb": dynamodb})
+
+    live = []
+    for row in rows:
+        item = synthetic_data.to_item(row)
+        table.put(item)
+        live.append(item)
+        emit("INSERT", table.key_item(item), None, item)
+
+    for _ in range(updates):
+        if not live:
+            break
+        position = generator.randrange(len(live))
+        old_item = live[position]
+        keys = table.key_item(old_item)
+        if generator.random() < 0.15:
+            table.delete(table.key_of(old_item))
+            live.pop(position)
+            emit("REMOVE", keys, old_item, None)
+            continue
+        new_item = dict(old_item)
+        if generator.random() < 0.1:
+            # A zero amount whose receipt flag flips - on a row already at zero only withReceiptCount moves
+            new_item["amount"] = {"N": "0"}
+            new_item["hasReceipt"] = {"BOOL": not old_item["hasReceipt"]["BOOL"]}
+            table.put(new_item)
+            live[position] = new_item
+            emit("MODIFY", keys, old_item, new_item)
+            continue
+        new_item["amount"] = {"N": str(round(generator.uniform(1, 5000), 2))}
+        new_item["hasReceipt"] = {"BOOL": generator.random() < 0.5}
+        new_item["date"] = {"S": f"2025-0{generator.randrange(1, 7)}-1{generator.randrange(0, 9)}"}
+        category = generator.choice(categories)
+        if category:
+            new_item["category"] = {"S": category}
+        else:
+            new_item.pop("category", None)
+        table.put(new_item)
+        live[position] = new_item
+        emit("MODIFY", keys, old_item, new_item)
+    return records
+
+
+#3 Shuffle the records into batches with duplicates
+def deliver(records, batch_size, duplicates, seed):
+    generator = random.Random(seed + 1)
+    delivered = list(records) + [generator.choice(records) for _ in range(int(len(records) * duplicates))]
+    generator.shuffle(delivered)
+    return [delivered[start:start + batch_size] for start in range(0, len(delivered), batch_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the aggregate stream Lambda against synthetic stream records")
+    parser.add_argument("--transactions", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=3000)
+    parser.add_argument("--duplicates", type=float, default=0.2, help="share of records delivered twice")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stream_lambda = load_stream_lambda()
+    stand_in = synthetic_data.seeded_stand_in(0)
+    stand_in.create_table(stream_lambda.AGGREGATE_TABLE_NAME, stream_lambda.PARTITION_KEY, "aggregateKey")
+    stream_lambda.client = stand_in
+    table = stand_in.tables[transactions_reader.TABLE_NAME]
+
+    records = generate_records(table, args.transactions, args.updates, args.seed)
+    batches = deliver(records, args.batch_size, args.duplicates, args.seed)
+
+    started = time.perf_counter()
+    delivered = 0
+    for batch in batches:
+        delivered += len(batch)
+        response = stream_lambda.lambda_handler({"Records": batch}, None)
+        if response["batchItemFailures"]:
+            raise SystemExit(f"Batch failures: {response['batchItemFailures']}")
+    elapsed = time.perf_counter() - started
+
+    # Ground truth from the final table, and the summary as the action group reads it from the aggregates
+    client_id = synthetic_data.client_id_for(0)
+    final_items = item_codec.decode_items(table.partition(transactions_reader.PARTITION_KEY, {"S": client_id}))
+    # Classified like get_summary does on read, so both paths must agree on byCategory
+    deduction_categories.classify_items(final_items)
+    expected = transactions_summary.summarize(final_items)
+    aggregates = transactions_reader.read_aggregates(stand_in, time.monotonic() + 60, client_id, stream_lambda.AGGREGATE_TABLE_NAME)
+    actual = transactions_summary.summarize_aggregates(aggregates["items"])
+
+    mismatches = []
+    for name in ("count", "total", "byMonth", "byCategory", "byReceipt"):
+        if json.dumps(expected[name], sort_keys=True) != json.dumps(actual[name], sort_keys=True):
+            mismatches.append({"field": name, "expected": expected[name], "actual": actual[name]})
+
+    print(json.dumps({
+        "records": len(records),
+        "delivered": delivered,
+        "batches": len(batches),
+        "recordsPerSecond": round(delivered / elapsed, 1),
+        "aggregateItemsRead": len(aggregates["items"]),
+        "match": not mismatches,
+        "mismatches": mismatches
+    }, indent=2))
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#1 imports - Check the deduction category rules against a table of transaction names
+#
+#   python tools/check_deduction_categories.py
+#
+# Every row of EXPECTED is classified with deduction_categories.classify; mismatches are printed and the exit
+# status is 1. Add a row whenever a rule is added or a name is found in the wrong category.
+import os
+import sys
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TOOLS_DIR, "..", "TaxReturnAgent", "MyobbSilverFinActionGroup"))
+
+import deduction_categories
+
+MOTOR = "Motor vehicle expenses"
+WORK = "Work-related expenses"
+EDUCATION = "Self-education expenses"
+UNION = "Union and professional association fees"
+DONATIONS = "Donations"
+TAX_AGENT = "Tax agent fees"
+INVESTMENT = "Investment expenses"
+HEALTH = "Private health insurance"
+PRIVATE = "Private expenses"
+
+#2 Transaction name -> category (None when no rule applies)
+EXPECTED = [
+    ("Motor vehicle expenses", MOTOR),
+    ("Fuel - BP Collins St", MOTOR),
+    ("Car service and rego", MOTOR),
+    ("Car registration fee", MOTOR),
+    ("Vehicle registration fees", MOTOR),
+    ("Linkt tolls", MOTOR),
+    ("Parking - Wilson", MOTOR),
+    # What was bought beats where
+    ("Woolworths Caltex fuel", MOTOR),
+    ("Buy a laptop", WORK),
+    ("Office chair", WORK),
+    ("Uniform and laundry", WORK),
+    ("Home office electricity", WORK),
+    ("Mobile phone plan", WORK),
+    ("Officeworks", WORK),
+    ("Self-education course fees", EDUCATION),
+    ("Textbooks", EDUCATION),
+    ("Udemy Python course", EDUCATION),
+    ("Union membership fees", UNION),
+    ("Professional association fees", UNION),
+    ("Professional registration fee", UNION),
+    ("CPA Australia membership", UNION),
+    ("Red Cross donation", DONATIONS),
+    ("Salvation Army", DONATIONS),
+    ("Tax agent fees", TAX_AGENT),
+    ("H&R Block", TAX_AGENT),
+    # The longer keyword wins over "loan"
+    ("Interest on investment loan", INVESTMENT),
+    ("Share portfolio management fee", INVESTMENT),
+    ("Rental property repairs", INVESTMENT),
+    ("Private health insurance", HEALTH),
+    ("Medibank", HEALTH),
+    ("Woolworths groceries", PRIVATE),
+    ("Rent", PRIVATE),
+    ("Netflix", PRIVATE),
+    # Whole words only - "carpet" is not a car, "rental" is not rent
+    ("Carpet cleaning", None),
+    ("Random hardware store", None),
+    ("", None),
+    (None, None),
+]
+
+
+def main():
+    failures = 0
+    for name, expected in EXPECTED:
+        actual = deduction_categories.classify(name)
+        if actual != expected:
+            failures += 1
+            print(f"{name!r}: expected {expected!r}, got {actual!r}")
+    print(f"{len(EXPECTED) - failures}/{len(EXPECTED)} names classified as expected")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
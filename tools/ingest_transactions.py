@@ -0,0 +1,375 @@
+#1 imports - Bulk load MYOB/Silverfin exports into the transactions table
+#
+#   python tools/ingest_transactions.py exports/myob_fy2025.csv --client-id client-0001 --source myob
+#   python tools/ingest_transactions.py exports/silverfin.jsonl --client-id client-0001 --source silverfin --endpoint-url http://localhost:8000
+#   python tools/ingest_transactions.py exports/myob_fy2025.csv --client-id client-0001 --stand-in --unprocessed-rate 0.1
+#
+# Rows are streamed from the file, normalized to the date/transactionName/amount/hasReceipt schema of
+# openai_schema.yml, keyed by the export's own row id or a content hash and written with BatchWriteItem from a thread pool.
+# Progress is checkpointed so an interrupted load resumes where it stopped.
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TOOLS_DIR, "..", "TaxReturnAgent", "MyobbSilverFinActionGroup"))
+sys.path.insert(0, TOOLS_DIR)
+
+import deduction_categories
+import result_cache
+import transactions_reader
+
+BATCH_SIZE = 25
+MAX_ATTEMPTS = 8
+
+#2 Column names used by MYOB and Silverfin exports, mapped onto the table schema
+COLUMN_ALIASES = {
+    "date": ["date", "transaction date", "booking date", "posting date", "journal date"],
+    "transactionName": ["transactionname", "description", "memo", "narration", "details", "payee", "account name"],
+    "amount": ["amount", "value", "net amount", "total"],
+    "debit": ["debit", "debit amount"],
+    "credit": ["credit", "credit amount"],
+    "hasReceipt": ["hasreceipt", "has receipt", "receipt", "attachment", "has attachment"],
+    "category": ["category", "tax category", "deduction category"],
+    "rowId": ["transactionid", "transaction id", "id", "line id", "entry id", "journal line id"],
+}
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d %b %Y", "%d %B %Y", "%Y/%m/%d", "%Y-%m-%dT%H:%M:%S"]
+
+
+def _column_map(columns):
+    lookup = {column.strip().lower(): column for column in columns}
+    mapping = {}
+    for name, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lookup:
+                mapping[name] = lookup[alias]
+                break
+    return mapping
+
+
+def _parse_date(value):
+    value = str(value or "").strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_amount(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return round(float(value), 2)
+    text = str(value).strip().replace("$", "").replace(",", "")
+    negative = text.startswith("(") and text.endswith(")")
+    text = text.strip("()")
+    if not text:
+        return None
+    try:
+        amount = float(text)
+    except ValueError:
+        return None
+    return round(-amount if negative else amount, 2)
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in ("true", "yes", "y", "1", "attached")
+
+
+#3 Normalize one export row - returns None for rows without a usable date or amount. occurrences counts the rows
+# of the export seen so far per content, across calls.
+def normalize(row, mapping, client_id, source, occurrences=None):
+    date = _parse_date(row.get(mapping.get("date")))
+    amount = _parse_amount(row.get(mapping["amount"])) if "amount" in mapping else None
+    if amount is None and ("debit" in mapping or "credit" in mapping):
+        debit = _parse_amount(row.get(mapping.get("debit"))) or 0.0
+        credit = _parse_amount(row.get(mapping.get("credit"))) or 0.0
+        amount = round(debit - credit, 2) if debit or credit else None
+    if date is None or amount is None:
+        return None
+
+    name = " ".join(str(row.get(mapping.get("transactionName")) or "").split())
+    transaction = {
+        "clientId": client_id,
+        "date": date,
+        "transactionName": name,
+        "amount": amount,
+        "hasReceipt": _parse_bool(row.get(mapping.get("hasReceipt"))),
+        "source": source,
+    }
+    # Categorized at load time, so the aggregates kept by the stream Lambda are grouped by deduction category too
+    category = " ".join(str(row.get(mapping.get("category")) or "").split()) or deduction_categories.classify(name)
+    if category:
+        transaction["category"] = category
+    # The hash is the sort key, so re-loading the same export overwrites instead of duplicating. It is taken from
+    # the export's own row id when it has one. Otherwise identical rows are real repeats (two coffees on the same
+    # day), so the n-th copy of a content in the export gets its own hash - the first keeps the plain content hash.
+    row_id = str(row.get(mapping.get("rowId")) or "").strip()
+    if row_id:
+        content = f"{client_id}|{source}|id|{row_id}"
+    else:
+        content = f"{client_id}|{source}|{date}|{name.lower()}|{amount:.2f}"
+        if occurrences is not None:
+            occurrence = occurrences.get(content, 0)
+            occurrences[content] = occurrence + 1
+            if occurrence:
+                content += f"|{occurrence}"
+    transaction["transactionId"] = hashlib.sha1(content.encode()).hexdigest()[:20]
+    return transaction
+
+
+def to_item(transaction):
+    item = {
+        "clientId": {"S": transaction["clientId"]},
+        "transactionId": {"S": transaction["transactionId"]},
+        "date": {"S": transaction["date"]},
+        "transactionName": {"S": transaction["transactionName"]},
+        "amount": {"N": repr(transaction["amount"])},
+        "hasReceipt": {"BOOL": transaction["hasReceipt"]},
+        "source": {"S": transaction["source"]},
+    }
+    if transaction.get("category"):
+        item["category"] = {"S": transaction["category"]}
+    return item
+
+
+#4 Stream rows out of CSV, JSON Lines or a JSON array without loading the whole file
+def read_rows(path):
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        if extension == ".csv":
+            yield from csv.DictReader(file)
+        elif extension in (".jsonl", ".ndjson"):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from _read_json_array(file)
+
+
+def _read_json_array(file, chunk_size=1 << 16):
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array of transactions")
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            row, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            more = file.read(chunk_size)
+            if not more:
+                raise
+            buffer += more
+            continue
+        yield row
+        buffer = buffer[end:]
+        if len(buffer) < chunk_size:
+            buffer += file.read(chunk_size)
+
+
+#5 BatchWriteItem with exponential backoff and jitter on UnprocessedItems
+# https://docs.aws.amazon.com/amazondynamodb/latest/APIReference/API_BatchWriteItem.html
+def write_batch(client, table_name, items, stats):
+    requests = {table_name: [{"PutRequest": {"Item": item}} for item in items]}
+    for attempt in range(MAX_ATTEMPTS):
+        response = client.batch_write_item(RequestItems=requests)
+        requests = response.get("UnprocessedItems") or {}
+        if not requests:
+            return
+        stats.add("retries", sum(len(pending) for pending in requests.values()))
+        time.sleep(min(0.05 * 2 ** attempt, 5.0) * random.uniform(0.5, 1.0))
+    raise RuntimeError(f"{sum(len(pending) for pending in requests.values())} items still unprocessed after {MAX_ATTEMPTS} attempts")
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {"rows": 0, "written": 0, "duplicates": 0, "invalid": 0, "retries": 0, "resumed_from": 0}
+
+    def add(self, name, value=1):
+        with self.lock:
+            self.values[name] += value
+
+
+#6 Checkpoints - the number of input rows whose batches (and all earlier batches) are written
+class Checkpoint:
+    def __init__(self, path, input_path):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+        self.lock = threading.Lock()
+        self.completed = {}
+        self.next_sequence = 0
+        self.rows_done = 0
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        with open(self.path) as file:
+            state = json.load(file)
+        if state.get("input") != self.input_path or state.get("size") != os.path.getsize(self.input_path):
+            print(f"Ignoring checkpoint {self.path} - it belongs to another input file", file=sys.stderr)
+            return 0
+        self.rows_done = state["rows_done"]
+        return self.rows_done
+
+    def batch_done(self, sequence, rows_through):
+        with self.lock:
+            self.completed[sequence] = rows_through
+            while self.next_sequence in self.completed:
+                self.rows_done = self.completed.pop(self.next_sequence)
+                self.next_sequence += 1
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            state = {"input": self.input_path, "size": os.path.getsize(self.input_path), "rows_done": self.rows_done}
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump(state, file)
+        os.replace(temporary, self.path)
+
+    def finish(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def ingest(client, path, client_id, source, table_name, workers=8, checkpoint_path=None, checkpoint_every=20):
+    stats = Stats()
+    checkpoint = Checkpoint(checkpoint_path, path)
+    skip = checkpoint.load()
+    stats.values["resumed_from"] = skip
+    started = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            _load(executor, client, path, client_id, source, table_name, workers, skip, checkpoint, checkpoint_every, stats)
+        # Bump the version counters so warm action group caches re-read the client's book - before the checkpoint
+        # goes, so a failed bump is retried by resuming
+        version_bumped = result_cache.bump_data_version(client, client_id)
+    except BaseException:
+        # Keep whatever contiguous progress was made, so the next run resumes from there
+        checkpoint.save()
+        raise
+
+    elapsed = time.perf_counter() - started
+    checkpoint.finish()
+
+    report = dict(stats.values)
+    report["version_bumped"] = version_bumped
+    report["seconds"] = round(elapsed, 2)
+    report["rows_per_second"] = round(stats.values["rows"] / elapsed, 1) if elapsed else None
+    return report
+
+
+def _load(executor, client, path, client_id, source, table_name, workers, skip, checkpoint, checkpoint_every, stats):
+    seen = set()
+    occurrences = {}
+    mapping = None
+    batch = []
+    sequence = 0
+    in_flight = set()
+
+    def run(items, batch_sequence, rows_through):
+        write_batch(client, table_name, items, stats)
+        stats.add("written", len(items))
+        checkpoint.batch_done(batch_sequence, rows_through)
+        if batch_sequence % checkpoint_every == 0:
+            checkpoint.save()
+
+    def submit(items, rows_through):
+        nonlocal sequence, in_flight
+        # Keep a bounded number of batches in flight so memory stays flat however large the export is
+        if len(in_flight) >= workers * 2:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        in_flight.add(executor.submit(run, items, sequence, rows_through))
+        sequence += 1
+
+    row_number = 0
+    for row_number, row in enumerate(read_rows(path), start=1):
+        if mapping is None:
+            mapping = _column_map(row.keys())
+            if "date" not in mapping or not ({"amount", "debit", "credit"} & mapping.keys()):
+                raise SystemExit(f"Cannot find date and amount columns in {list(row.keys())}")
+        # Rows loaded before the checkpoint are still counted, so repeats keep the same hash when resuming
+        transaction = normalize(row, mapping, client_id, source, occurrences)
+        if row_number <= skip:
+            continue
+        stats.add("rows")
+
+        if transaction is None:
+            stats.add("invalid")
+            continue
+        if transaction["transactionId"] in seen:
+            stats.add("duplicates")
+            continue
+        seen.add(transaction["transactionId"])
+
+        batch.append(to_item(transaction))
+        if len(batch) == BATCH_SIZE:
+            submit(batch, row_number)
+            batch = []
+
+    if batch:
+        submit(batch, row_number)
+    for future in in_flight:
+        future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load MYOB/Silverfin exports into the transactions table")
+    parser.add_argument("input", help="CSV, JSON Lines (.jsonl) or JSON array export")
+    parser.add_argument("--client-id", required=True)
+    parser.add_argument("--source", required=True, choices=["myob", "silverfin"])
+    parser.add_argument("--table", default=transactions_reader.TABLE_NAME)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <input>.checkpoint.json)")
+    parser.add_argument("--endpoint-url", help="DynamoDB Local endpoint")
+    parser.add_argument("--stand-in", action="store_true", help="load into the in-memory stand-in instead of DynamoDB")
+    parser.add_argument("--unprocessed-rate", type=float, default=0.0, help="stand-in only: share of writes pushed back")
+    args = parser.parse_args()
+
+    if args.stand_in:
+        import synthetic_data
+        client = synthetic_data.seeded_stand_in(0, unprocessed_rate=args.unprocessed_rate)
+    else:
+        import boto3
+        from botocore.config import Config
+        client = boto3.client(
+            "dynamodb",
+            endpoint_url=args.endpoint_url,
+            config=Config(max_pool_connections=args.workers, tcp_keepalive=True, retries={"mode": "adaptive", "max_attempts": 10})
+        )
+
+    report = ingest(
+        client,
+        args.input,
+        args.client_id,
+        args.source,
+        args.table,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint or args.input + ".checkpoint.json"
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#1 imports - Load test of the Streamlit chat UI - concurrent sessions driven through app.py with AppTest
+#
+#   python tools/load_test_app.py --levels 1,2,4,8,16 --turns 3
+#   python tools/load_test_app.py --replay recorded.jsonl --prompts prompts.txt --levels 4,8,16,32 --output load.json
+#   python tools/load_test_app.py --no-delays   (script cost only - the agent answers instantly)
+#
+# The agent is the replay client of UI/stream_recording.py, serving a recording made with BEDROCK_RECORD_PATH or a
+# synthetic turn (about 2.5 s of traces and a streamed answer), so no AWS access is needed. Every level opens N
+# sessions on one server process (one AppTest each, like N browser tabs) and has them all ask their turns at once.
+# Reported per level: turn latency p50/p95/p99, idle rerun script time and turns per second; the saturation point
+# is the first level whose throughput grows less than 10% over the level before. Memory per session is measured
+# once, with tracemalloc, before the ramp.
+import argparse
+import base64
+import gc
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(TOOLS_DIR, "..", "app.py")
+sys.path.insert(0, os.path.join(TOOLS_DIR, ".."))
+sys.path.insert(0, TOOLS_DIR)
+
+# Before app.py configures logging, so the ramp is not drowned in one INFO line per agent call
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+logging.basicConfig(level=logging.WARNING)
+
+from streamlit.testing.v1 import AppTest
+from UI import bedrock_agent_runtime
+from UI import response_cache
+from UI.perf_metrics import percentile
+from UI.stream_recording import read_recordings
+from run_prompt_suite import read_prompts
+
+SATURATION_GAIN = 0.10
+
+
+#2 A turn that looks like the agent's - pre-processing, two orchestration steps with model and action group
+# metadata, then the answer streamed in chunks
+def synthetic_recording(prompt="What can I claim for my car?"):
+    answer = ("You can claim motor vehicle expenses for work-related car trips using the cents per kilometre "
+              "method, up to 5,000 business kilometres, or the logbook method for the business-use percentage "
+              "of your actual running costs.")
+    words = answer.split(" ")
+    chunks = [" ".join(words[i:i + 4]) + " " for i in range(0, len(words), 4)]
+    model_output = {"metadata": {"usage": {"inputTokens": 1800, "outputTokens": 120}, "totalTimeMs": 650}}
+    events = [
+        {"gapMs": 350, "event": {"trace": {"trace": {"preProcessingTrace": {
+            "modelInvocationOutput": dict(model_output, traceId="pre-0")}}}}},
+        {"gapMs": 650, "event": {"trace": {"trace": {"orchestrationTrace": {
+            "modelInvocationOutput": dict(model_output, traceId="orch-0")}}}}},
+        {"gapMs": 5, "event": {"trace": {"trace": {"orchestrationTrace": {
+            "rationale": {"traceId": "orch-0", "text": "The client asks about car expenses, look up the transactions."}}}}}},
+        {"gapMs": 400, "event": {"trace": {"trace": {"orchestrationTrace": {
+            "observation": {"traceId": "orch-0", "type": "ACTION_GROUP",
+                            "actionGroupInvocationOutput": {"text": "{}", "metadata": {"totalTimeMs": 380}}}}}}}},
+        {"gapMs": 650, "event": {"trace": {"trace": {"orchestrationTrace": {
+            "modelInvocationOutput": dict(model_output, traceId="orch-1")}}}}},
+    ]
+    for chunk in chunks:
+        events.append({"gapMs": 40, "event": {"chunk": {"bytes": {"$bytes": base64.b64encode(chunk.encode()).decode()}}}})
+    return {"inputText": prompt, "requestMs": 250, "events": events}
+
+
+#3 One session - open the page, ask, and rerun without input (what every widget click costs)
+def open_session(timeout):
+    session = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    session.run()
+    return session
+
+
+def ask(session, prompt):
+    started = time.perf_counter()
+    session.chat_input[0].set_value(prompt).run()
+    latency_ms = (time.perf_counter() - started) * 1000
+    error = str(session.exception[0].value) if session.exception else None
+    return latency_ms, error
+
+
+def idle_rerun(session):
+    started = time.perf_counter()
+    session.run()
+    return (time.perf_counter() - started) * 1000
+
+
+#4 Memory held per session after its turns - history, traces and widget state of sessions opened one at a time.
+# A first session is run beforehand so the modules app.py imports and the shared client are not counted.
+def memory_per_session(sessions, turns, prompts, timeout):
+    ask(open_session(timeout), prompts[0])
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = []
+    for index in range(sessions):
+        session = open_session(timeout)
+        for turn in range(turns):
+            ask(session, prompts[(index * turns + turn) % len(prompts)])
+        held.append(session)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return round((after - before) / sessions / 1024, 1)
+
+
+#5 One level - sessions are opened one by one (the first run compiles the script, and compiling in many threads at
+# once is not safe), then all of them ask their turns at once
+def run_level(level, turns, prompts, timeout):
+    sessions = [open_session(timeout) for _ in range(level)]
+    latencies = []
+    reruns = []
+    errors = []
+    lock = threading.Lock()
+    start = threading.Barrier(level + 1)
+
+    def drive(index, session):
+        start.wait()
+        for turn in range(turns):
+            latency_ms, error = ask(session, prompts[(index * turns + turn) % len(prompts)])
+            with lock:
+                if error:
+                    errors.append(error)
+                else:
+                    latencies.append(latency_ms)
+        rerun_ms = idle_rerun(session)
+        with lock:
+            reruns.append(rerun_ms)
+
+    threads = [threading.Thread(target=drive, args=(index, session), daemon=True) for index, session in enumerate(sessions)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "sessions": level,
+        "turns": level * turns,
+        "errors": len(errors),
+        "wallSeconds": round(wall_seconds, 2),
+        "turnsPerSecond": round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+        "turnMs": {rank: _round(percentile(latencies, value)) for rank, value in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "idleRerunMs": {"p50": _round(percentile(reruns, 50)), "p95": _round(percentile(reruns, 95))},
+        "peakRssMb": round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "firstError": errors[0] if errors else None,
+    }
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+# First level whose throughput is less than SATURATION_GAIN better than the level before
+def saturation_point(results):
+    for previous, current in zip(results, results[1:]):
+        if not previous["turnsPerSecond"] or current["turnsPerSecond"] < previous["turnsPerSecond"] * (1 + SATURATION_GAIN):
+            return current["sessions"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp concurrent chat sessions through app.py and report latency, script time and memory")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="comma separated session counts, run in order")
+    parser.add_argument("--turns", type=int, default=3, help="chat turns per session at every level")
+    parser.add_argument("--replay", help="recording made with BEDROCK_RECORD_PATH - defaults to a synthetic turn")
+    parser.add_argument("--prompts", help="prompt file, as for run_prompt_suite.py - defaults to the recorded prompts")
+    parser.add_argument("--no-delays", action="store_true", help="answer instantly instead of with the recorded delays")
+    parser.add_argument("--speed", type=float, default=1.0, help="divide the recorded delays by this")
+    parser.add_argument("--memory-sessions", type=int, default=4, help="sessions opened to measure memory per session, 0 to skip")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds one script run may take")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    recording_path = args.replay
+    if recording_path is None:
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False, encoding="utf-8") as file:
+            file.write(json.dumps(synthetic_recording()) + "\n")
+            recording_path = file.name
+    # The synthetic recording is removed when the run ends, also when it fails or is interrupted
+    try:
+        prompts = read_prompts(args.prompts) if args.prompts else [recording["inputText"] for recording in read_recordings(recording_path)]
+
+        # Every session of the process shares the one replay client, like the real client; answers always come from
+        # the agent so the whole pipeline is measured
+        bedrock_agent_runtime.BEDROCK_REPLAY_PATH = recording_path
+        bedrock_agent_runtime.BEDROCK_REPLAY_KEEP_TIMING = not args.no_delays
+        bedrock_agent_runtime.BEDROCK_REPLAY_SPEED = args.speed
+        response_cache.RESPONSE_CACHE_ENABLED = False
+
+        summary = {"levels": [], "turnsPerSession": args.turns, "delays": not args.no_delays}
+        if args.memory_sessions > 0:
+            summary["memoryPerSessionKb"] = memory_per_session(args.memory_sessions, args.turns, prompts, args.timeout)
+            print(f"memory per session: {summary['memoryPerSessionKb']} KB", file=sys.stderr)
+        for level in levels:
+            result = run_level(level, args.turns, prompts, args.timeout)
+            summary["levels"].append(result)
+            print(f"{level} sessions: {result['turnsPerSecond']} turns/s, turn p95 {result['turnMs']['p95']} ms, "
+                  f"idle rerun p95 {result['idleRerunMs']['p95']} ms, {result['errors']} errors", file=sys.stderr)
+        summary["saturatedAtSessions"] = saturation_point(summary["levels"])
+
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as file:
+                json.dump(summary, file, indent=2)
+        print(json.dumps(summary, indent=2))
+    finally:
+        if args.replay is None:
+            os.unlink(recording_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,706 @@
+#1 imports - In-memory DynamoDB stand-in for local benchmarks and tools
+# Implements the subset of the low-level boto3 DynamoDB client API used by this repo, with wire-format items,
+# 1 MB result pages, parallel scan segments, GSIs, expressions and simulated consumed capacity.
+import json
+import math
+import re
+import threading
+import zlib
+from decimal import Decimal
+from botocore.exceptions import ClientError
+
+# DynamoDB returns at most 1 MB of data per scan/query page
+PAGE_SIZE_BYTES = 1024 * 1024
+# Read and write capacity units are charged per 4 KB read and per 1 KB written
+READ_UNIT_BYTES = 4096
+WRITE_UNIT_BYTES = 1024
+
+
+def _error(code, message, operation):
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+#2 Attribute value helpers - numbers are compared as Decimal, like DynamoDB does
+def _to_python(attribute):
+    type_name, value = next(iter(attribute.items()))
+    if type_name == "N":
+        return Decimal(value)
+    if type_name == "NS":
+        return {Decimal(number) for number in value}
+    if type_name in ("SS", "BS"):
+        return set(value)
+    if type_name == "NULL":
+        return None
+    if type_name == "M":
+        return {name: _to_python(item) for name, item in value.items()}
+    if type_name == "L":
+        return [_to_python(item) for item in value]
+    return value
+
+
+def _to_attribute(value):
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, (int, float, Decimal)):
+        return {"N": str(value)}
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, (bytes, bytearray)):
+        return {"B": bytes(value)}
+    if isinstance(value, dict):
+        return {"M": {name: _to_attribute(item) for name, item in value.items()}}
+    if isinstance(value, list):
+        return {"L": [_to_attribute(item) for item in value]}
+    if isinstance(value, set):
+        if all(isinstance(item, (int, float, Decimal)) for item in value):
+            return {"NS": sorted(str(item) for item in value)}
+        return {"SS": sorted(value)}
+    raise TypeError(f"Unsupported value {value!r}")
+
+
+# Item size as DynamoDB counts it - attribute names plus values, numbers at about one byte per two digits
+# https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/CapacityUnitCalculations.html
+def _attribute_size(attribute):
+    (type_name, value), = attribute.items()
+    if type_name == "S":
+        return len(value.encode())
+    if type_name == "N":
+        return (len(value) + 1) // 2 + 1
+    if type_name in ("BOOL", "NULL"):
+        return 1
+    if type_name == "L":
+        return 3 + sum(1 + _attribute_size(element) for element in value)
+    if type_name == "M":
+        return 3 + sum(len(name) + 1 + _attribute_size(element) for name, element in value.items())
+    if type_name in ("SS", "NS", "BS"):
+        return sum(len(str(element)) for element in value)
+    return len(str(value))
+
+
+def item_size(item):
+    return sum(len(name) + _attribute_size(attribute) for name, attribute in item.items())
+
+
+# Key values are scalars (S, N or B) - "S:value" tells them apart and is far cheaper than JSON
+def _key_value(attribute):
+    if len(attribute) == 1:
+        (type_name, value), = attribute.items()
+        if isinstance(value, str):
+            return type_name + ":" + value
+    return json.dumps(attribute, sort_keys=True)
+
+
+#3 Tokenizer and parser for condition, key condition, filter, projection and update expressions
+_TOKEN = re.compile(r"\s*(<>|<=|>=|=|<|>|\(|\)|,|\+|-|[#:]?[A-Za-z0-9_]+(?:\[\d+\])?(?:\.[#]?[A-Za-z0-9_]+(?:\[\d+\])?)*)")
+
+
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise ValueError(f"Cannot parse expression at: {expression[position:]!r}")
+        tokens.append(match.group(1))
+        position = match.end()
+        while position < len(expression) and expression[position].isspace():
+            position += 1
+    return tokens
+
+
+class _Expression:
+    def __init__(self, expression, names=None, values=None):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if expected is not None and (token or "").upper() != expected:
+            raise ValueError(f"Expected {expected} but got {token}")
+        self.position += 1
+        return token
+
+    def path(self, token):
+        return [self.names.get(part, part) for part in token.split(".")]
+
+    # Condition grammar: or_expr := and_expr (OR and_expr)* ; and_expr := not_expr (AND not_expr)*
+    def parse_condition(self):
+        node = self._and()
+        while (self.peek() or "").upper() == "OR":
+            self.take()
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self):
+        node = self._not()
+        while (self.peek() or "").upper() == "AND":
+            self.take()
+            node = ("and", node, self._not())
+        return node
+
+    def _not(self):
+        if (self.peek() or "").upper() == "NOT":
+            self.take()
+            return ("not", self._not())
+        return self._comparison()
+
+    def _comparison(self):
+        if self.peek() == "(":
+            self.take()
+            node = self.parse_condition()
+            self.take(")")
+            return node
+
+        left = self.operand()
+        operator = (self.peek() or "").upper()
+        if operator in ("=", "<>", "<", "<=", ">", ">="):
+            self.take()
+            return ("compare", operator, left, self.operand())
+        if operator == "BETWEEN":
+            self.take()
+            low = self.operand()
+            self.take("AND")
+            return ("between", left, low, self.operand())
+        if operator == "IN":
+            self.take()
+            self.take("(")
+            options = [self.operand()]
+            while self.peek() == ",":
+                self.take()
+                options.append(self.operand())
+            self.take(")")
+            return ("in", left, options)
+        if left[0] == "function":
+            return left
+        raise ValueError(f"Unexpected token {self.peek()}")
+
+    def operand(self):
+        token = self.take()
+        if self.peek() == "(":
+            self.take()
+            arguments = [self.operand()]
+            while self.peek() == ",":
+                self.take()
+                arguments.append(self.operand())
+            self.take(")")
+            return ("function", token, arguments)
+        if token.startswith(":"):
+            return ("value", self.values[token])
+        return ("path", self.path(token))
+
+
+def _resolve_path(item, path):
+    if not path:
+        return None
+    current = item.get(path[0])
+    for part in path[1:]:
+        if current is None:
+            return None
+        type_name, value = next(iter(current.items()))
+        if type_name != "M":
+            return None
+        current = value.get(part)
+    return current
+
+
+def _evaluate_operand(operand, item):
+    kind = operand[0]
+    if kind == "value":
+        return _to_python(operand[1])
+    if kind == "path":
+        attribute = _resolve_path(item, operand[1])
+        return None if attribute is None else _to_python(attribute)
+    if kind == "function":
+        name, arguments = operand[1], operand[2]
+        if name == "size":
+            value = _evaluate_operand(arguments[0], item)
+            return None if value is None else len(value)
+        if name == "if_not_exists":
+            value = _evaluate_operand(arguments[0], item)
+            return _evaluate_operand(arguments[1], item) if value is None else value
+        return _evaluate_function(operand, item)
+    raise ValueError(f"Unknown operand {operand}")
+
+
+def _evaluate_function(node, item):
+    name, arguments = node[1], node[2]
+    if name == "attribute_exists":
+        return _resolve_path(item, arguments[0][1]) is not None
+    if name == "attribute_not_exists":
+        return _resolve_path(item, arguments[0][1]) is None
+    if name == "begins_with":
+        value = _evaluate_operand(arguments[0], item)
+        prefix = _evaluate_operand(arguments[1], item)
+        return isinstance(value, str) and value.startswith(prefix)
+    if name == "contains":
+        value = _evaluate_operand(arguments[0], item)
+        operand = _evaluate_operand(arguments[1], item)
+        return value is not None and operand in value
+    raise ValueError(f"Unsupported function {name}")
+
+
+def _compare(operator, left, right):
+    if left is None or right is None or type(left) is not type(right):
+        return operator == "<>" and left != right
+    if operator == "=":
+        return left == right
+    if operator == "<>":
+        return left != right
+    if operator == "<":
+        return left < right
+    if operator == "<=":
+        return left <= right
+    if operator == ">":
+        return left > right
+    return left >= right
+
+
+def evaluate_condition(node, item):
+    kind = node[0]
+    if kind == "or":
+        return evaluate_condition(node[1], item) or evaluate_condition(node[2], item)
+    if kind == "and":
+        return evaluate_condition(node[1], item) and evaluate_condition(node[2], item)
+    if kind == "not":
+        return not evaluate_condition(node[1], item)
+    if kind == "compare":
+        return _compare(node[1], _evaluate_operand(node[2], item), _evaluate_operand(node[3], item))
+    if kind == "between":
+        value = _evaluate_operand(node[1], item)
+        low = _evaluate_operand(node[2], item)
+        high = _evaluate_operand(node[3], item)
+        return _compare(">=", value, low) and _compare("<=", value, high)
+    if kind == "in":
+        value = _evaluate_operand(node[1], item)
+        return any(_compare("=", value, _evaluate_operand(option, item)) for option in node[2])
+    if kind == "function":
+        return _evaluate_function(node, item)
+    raise ValueError(f"Unknown condition {node}")
+
+
+def parse_condition(expression, names=None, values=None):
+    parser = _Expression(expression, names, values)
+    node = parser.parse_condition()
+    if parser.peek() is not None:
+        raise ValueError(f"Unexpected token {parser.peek()} in {expression!r}")
+    return node
+
+
+def _partition_value(node, partition_key):
+    # The key condition is "pk = :value" optionally AND-ed with a sort key condition
+    if node[0] == "and":
+        return _partition_value(node[1], partition_key) or _partition_value(node[2], partition_key)
+    if node[0] == "compare" and node[1] == "=" and node[2][0] == "path" and node[2][1] == [partition_key] and node[3][0] == "value":
+        return node[3][1]
+    return None
+
+
+def project(item, expression, names=None):
+    projected = {}
+    for part in expression.split(","):
+        path = [(names or {}).get(name, name) for name in part.strip().split(".")]
+        if path[0] in item:
+            projected[path[0]] = item[path[0]]
+    return projected
+
+
+#4 Update expressions - SET (with + / - and if_not_exists), ADD and REMOVE on top-level or nested map paths
+def _set_path(item, path, attribute):
+    target = item
+    for part in path[:-1]:
+        container = target.setdefault(part, {"M": {}})
+        target = container["M"]
+    if attribute is None:
+        target.pop(path[-1], None)
+    else:
+        target[path[-1]] = attribute
+
+
+def apply_update(item, expression, names=None, values=None):
+    parser = _Expression(expression, names, values)
+    while parser.peek() is not None:
+        action = parser.take().upper()
+        while True:
+            if action == "SET":
+                path = parser.path(parser.take())
+                parser.take("=")
+                value = _evaluate_operand(parser.operand(), item)
+                while parser.peek() in ("+", "-"):
+                    operator = parser.take()
+                    other = _evaluate_operand(parser.operand(), item)
+                    value = value + other if operator == "+" else value - other
+                _set_path(item, path, _to_attribute(value))
+            elif action == "ADD":
+                path = parser.path(parser.take())
+                increment = _evaluate_operand(parser.operand(), item)
+                current = _resolve_path(item, path)
+                current = None if current is None else _to_python(current)
+                if isinstance(increment, set):
+                    value = (current or set()) | increment
+                else:
+                    value = (current or Decimal(0)) + increment
+                _set_path(item, path, _to_attribute(value))
+            elif action == "REMOVE":
+                _set_path(item, parser.path(parser.take()), None)
+            else:
+                raise ValueError(f"Unsupported update action {action}")
+            if parser.peek() != ",":
+                break
+            parser.take()
+
+
+#5 One table - items are kept in insertion order, with a per-partition index for queries
+class _Table:
+    def __init__(self, name, partition_key, sort_key=None, indexes=None):
+        self.name = name
+        self.partition_key = partition_key
+        self.sort_key = sort_key
+        # {index name: (partition key, sort key or None)}
+        self.indexes = dict(indexes or {})
+        self.items = {}
+        self.order = []
+        self.positions = {}
+        # {partition key name: {encoded partition value: set of item keys}} for the table and every index
+        self.partitions = {name: {} for name in {partition_key} | {pk for pk, _ in self.indexes.values()}}
+        # Sorted query results by key condition, valid while the table version has not moved. Pages of one query
+        # then cost the page, not a re-sort of the partition.
+        self.version = 0
+        self.query_results = {}
+        # Sizes of the stored items, by id() of the item object, so pages do not re-measure them
+        self.sizes = {}
+        self.lock = threading.RLock()
+
+    def key_attributes(self, index_name=None):
+        names = [self.partition_key] + ([self.sort_key] if self.sort_key else [])
+        if index_name:
+            index_partition, index_sort = self.indexes[index_name]
+            names += [name for name in (index_partition, index_sort) if name and name not in names]
+        return names
+
+    def key_of(self, item):
+        partition = item.get(self.partition_key)
+        if partition is None:
+            raise _error("ValidationException", f"Missing key {self.partition_key}", "PutItem")
+        key = (_key_value(partition),)
+        if self.sort_key:
+            sort = item.get(self.sort_key)
+            if sort is None:
+                raise _error("ValidationException", f"Missing key {self.sort_key}", "PutItem")
+            key += (_key_value(sort),)
+        return key
+
+    def key_item(self, item, index_name=None):
+        return {name: item[name] for name in self.key_attributes(index_name) if name in item}
+
+    def _index(self, key, item, add):
+        for name, partitions in self.partitions.items():
+            if name not in item:
+                continue
+            value = _key_value(item[name])
+            if add:
+                partitions.setdefault(value, set()).add(key)
+            else:
+                partitions.get(value, set()).discard(key)
+
+    def put(self, item):
+        key = self.key_of(item)
+        with self.lock:
+            if key not in self.positions:
+                self.positions[key] = len(self.order)
+                self.order.append(key)
+            previous = self.items.get(key)
+            if previous is not None:
+                self._index(key, previous, add=False)
+                self.sizes.pop(id(previous), None)
+            self.items[key] = item
+            self.sizes[id(item)] = item_size(item)
+            self._index(key, item, add=True)
+            self.version += 1
+
+    def delete(self, key):
+        with self.lock:
+            previous = self.items.pop(key, None)
+            if previous is not None:
+                self._index(key, previous, add=False)
+                self.sizes.pop(id(previous), None)
+                self.version += 1
+
+    def size_of(self, item):
+        size = self.sizes.get(id(item))
+        return item_size(item) if size is None else size
+
+    def partition_keys(self, partition_key, value):
+        with self.lock:
+            return [key for key in self.partitions[partition_key].get(_key_value(value), ()) if key in self.items]
+
+    def partition(self, partition_key, value):
+        with self.lock:
+            return [self.items[key] for key in self.partition_keys(partition_key, value)]
+
+    def ordered_keys(self, start_after=None):
+        start = 0
+        if start_after is not None:
+            start = self.positions.get(start_after, -1) + 1
+        return self.order[start:]
+
+
+#6 The stand-in client
+class LocalDynamoDB:
+    def __init__(self, unprocessed_rate=0.0, latency_seconds=0.0):
+        self.tables = {}
+        # Share of batch writes returned as UnprocessedItems, to exercise the callers' retry paths
+        self.unprocessed_rate = unprocessed_rate
+        # Simulated network round trip per request
+        self.latency_seconds = latency_seconds
+        self.request_count = 0
+        self.consumed_read_units = 0.0
+        self.consumed_write_units = 0.0
+        self._batch_calls = 0
+        self._counter_lock = threading.Lock()
+
+    def create_table(self, name, partition_key, sort_key=None, indexes=None):
+        self.tables[name] = _Table(name, partition_key, sort_key, indexes)
+        return self.tables[name]
+
+    def _table(self, name, operation):
+        table = self.tables.get(name)
+        if table is None:
+            raise _error("ResourceNotFoundException", f"Requested resource not found: Table: {name} not found", operation)
+        return table
+
+    def _request(self):
+        with self._counter_lock:
+            self.request_count += 1
+        if self.latency_seconds:
+            import time
+            time.sleep(self.latency_seconds)
+
+    def _read_units(self, size_bytes, consistent=False):
+        units = math.ceil(max(size_bytes, 1) / READ_UNIT_BYTES) * (1.0 if consistent else 0.5)
+        with self._counter_lock:
+            self.consumed_read_units += units
+        return units
+
+    def _write_units(self, size_bytes):
+        units = float(math.ceil(max(size_bytes, 1) / WRITE_UNIT_BYTES))
+        with self._counter_lock:
+            self.consumed_write_units += units
+        return units
+
+    def _capacity(self, kwargs, table_name, units):
+        if kwargs.get("ReturnConsumedCapacity") in ("TOTAL", "INDEXES"):
+            return {"ConsumedCapacity": {"TableName": table_name, "CapacityUnits": units}}
+        return {}
+
+    # Reads
+    def get_item(self, TableName, Key, ProjectionExpression=None, ExpressionAttributeNames=None, ConsistentRead=False, **kwargs):
+        self._request()
+        table = self._table(TableName, "GetItem")
+        item = table.items.get(table.key_of(Key))
+        response = self._capacity(kwargs, TableName, self._read_units(table.size_of(item) if item else 0, ConsistentRead))
+        if item is not None:
+            response["Item"] = project(item, ProjectionExpression, ExpressionAttributeNames) if ProjectionExpression else dict(item)
+        return response
+
+    def _page(self, table, candidates, kwargs, index_name=None):
+        names = kwargs.get("ExpressionAttributeNames")
+        values = kwargs.get("ExpressionAttributeValues")
+        filter_node = None
+        if kwargs.get("FilterExpression"):
+            filter_node = parse_condition(kwargs["FilterExpression"], names, values)
+        limit = kwargs.get("Limit")
+
+        items = []
+        scanned = 0
+        size = 0
+        last_item = None
+        exhausted = True
+        for item in candidates:
+            scanned += 1
+            size += table.size_of(item)
+            last_item = item
+            if filter_node is None or evaluate_condition(filter_node, item):
+                if kwargs.get("ProjectionExpression"):
+                    items.append(project(item, kwargs["ProjectionExpression"], names))
+                else:
+                    items.append(dict(item))
+            if size >= PAGE_SIZE_BYTES or (limit and scanned >= limit):
+                exhausted = False
+                break
+
+        response = {"Items": items, "Count": len(items), "ScannedCount": scanned}
+        response.update(self._capacity(kwargs, table.name, self._read_units(size, kwargs.get("ConsistentRead", False))))
+        if not exhausted and last_item is not None:
+            response["LastEvaluatedKey"] = table.key_item(last_item, index_name)
+        return response
+
+    def scan(self, TableName, **kwargs):
+        self._request()
+        table = self._table(TableName, "Scan")
+        start_after = table.key_of(kwargs["ExclusiveStartKey"]) if kwargs.get("ExclusiveStartKey") else None
+        segment = kwargs.get("Segment")
+        total_segments = kwargs.get("TotalSegments")
+
+        def candidates():
+            for key in table.ordered_keys(start_after):
+                item = table.items.get(key)
+                if item is None:
+                    continue
+                if total_segments and zlib.crc32(key[0].encode()) % total_segments != segment:
+                    continue
+                yield item
+
+        return self._page(table, candidates(), kwargs)
+
+    def query(self, TableName, KeyConditionExpression, IndexName=None, ScanIndexForward=True, **kwargs):
+        self._request()
+        table = self._table(TableName, "Query")
+        if IndexName:
+            if IndexName not in table.indexes:
+                raise _error("ValidationException", f"The table does not have the specified index: {IndexName}", "Query")
+            partition_key, sort_key = table.indexes[IndexName]
+        else:
+            partition_key, sort_key = table.partition_key, table.sort_key
+
+        names = kwargs.get("ExpressionAttributeNames")
+        values = kwargs.get("ExpressionAttributeValues")
+        key_node = parse_condition(KeyConditionExpression, names, values)
+        partition_value = _partition_value(key_node, partition_key)
+        if partition_value is None:
+            raise _error("ValidationException", "Query condition missed key schema element", "Query")
+
+        cache_key = (KeyConditionExpression, json.dumps(names, sort_keys=True), json.dumps(values, sort_keys=True), IndexName, ScanIndexForward)
+        with table.lock:
+            cached = table.query_results.get(cache_key)
+            if cached is None or cached[0] != table.version:
+                keys = [key for key in table.partition_keys(partition_key, partition_value) if evaluate_condition(key_node, table.items[key])]
+                if sort_key:
+                    keys = [key for key in keys if sort_key in table.items[key]]
+                    keys.sort(key=lambda key: (_to_python(table.items[key][sort_key]), key), reverse=not ScanIndexForward)
+                matching = [table.items[key] for key in keys]
+                cached = (table.version, matching, {key: position for position, key in enumerate(keys)})
+                table.query_results[cache_key] = cached
+        _, matching, positions = cached
+
+        start = 0
+        if kwargs.get("ExclusiveStartKey"):
+            start = positions.get(table.key_of(kwargs["ExclusiveStartKey"]), -1) + 1
+
+        return self._page(table, (matching[position] for position in range(start, len(matching))), kwargs, IndexName)
+
+    # Writes
+    def _check_condition(self, table, key, kwargs, operation):
+        if not kwargs.get("ConditionExpression"):
+            return
+        node = parse_condition(kwargs["ConditionExpression"], kwargs.get("ExpressionAttributeNames"), kwargs.get("ExpressionAttributeValues"))
+        if not evaluate_condition(node, table.items.get(key) or {}):
+            raise _error("ConditionalCheckFailedException", "The conditional request failed", operation)
+
+    def put_item(self, TableName, Item, **kwargs):
+        self._request()
+        table = self._table(TableName, "PutItem")
+        with table.lock:
+            self._check_condition(table, table.key_of(Item), kwargs, "PutItem")
+            table.put(dict(Item))
+        return self._capacity(kwargs, TableName, self._write_units(item_size(Item)))
+
+    def delete_item(self, TableName, Key, **kwargs):
+        self._request()
+        table = self._table(TableName, "DeleteItem")
+        key = table.key_of(Key)
+        with table.lock:
+            self._check_condition(table, key, kwargs, "DeleteItem")
+            table.delete(key)
+        return self._capacity(kwargs, TableName, self._write_units(0))
+
+    def update_item(self, TableName, Key, UpdateExpression, ReturnValues="NONE", **kwargs):
+        self._request()
+        table = self._table(TableName, "UpdateItem")
+        key = table.key_of(Key)
+        with table.lock:
+            self._check_condition(table, key, kwargs, "UpdateItem")
+            item = json.loads(json.dumps(table.items.get(key) or dict(Key)))
+            apply_update(item, UpdateExpression, kwargs.get("ExpressionAttributeNames"), kwargs.get("ExpressionAttributeValues"))
+            table.put(item)
+        response = self._capacity(kwargs, TableName, self._write_units(item_size(item)))
+        if ReturnValues in ("ALL_NEW", "UPDATED_NEW"):
+            response["Attributes"] = item
+        return response
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self._request()
+        unprocessed = {}
+        units = 0.0
+        with self._counter_lock:
+            self._batch_calls += 1
+            call = self._batch_calls
+        for table_name, requests in RequestItems.items():
+            if len(requests) > 25:
+                raise _error("ValidationException", "Too many items requested for the BatchWriteItem call", "BatchWriteItem")
+            table = self._table(table_name, "BatchWriteItem")
+            for position, request in enumerate(requests):
+                # Deterministically push back a share of the writes, like a throttled table would
+                if self.unprocessed_rate and zlib.crc32(f"{call}:{position}".encode()) % 1000 < self.unprocessed_rate * 1000:
+                    unprocessed.setdefault(table_name, []).append(request)
+                    continue
+                if "PutRequest" in request:
+                    item = request["PutRequest"]["Item"]
+                    table.put(dict(item))
+                    units += self._write_units(item_size(item))
+                else:
+                    table.delete(table.key_of(request["DeleteRequest"]["Key"]))
+                    units += self._write_units(0)
+        response = {"UnprocessedItems": unprocessed}
+        if kwargs.get("ReturnConsumedCapacity") in ("TOTAL", "INDEXES"):
+            response["ConsumedCapacity"] = [{"CapacityUnits": units}]
+        return response
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        self._request()
+        tables = []
+        for entry in TransactItems:
+            (operation, request), = entry.items()
+            tables.append((operation, request, self._table(request["TableName"], "TransactWriteItems")))
+
+        locks = sorted({id(table.lock): table.lock for _, _, table in tables}.items())
+        for _, lock in locks:
+            lock.acquire()
+        try:
+            # All conditions are checked before anything is written, so the transaction applies all or nothing
+            reasons = []
+            for operation, request, table in tables:
+                key = table.key_of(request.get("Key") or request.get("Item"))
+                try:
+                    self._check_condition(table, key, request, "TransactWriteItems")
+                    reasons.append({"Code": "None"})
+                except ClientError:
+                    reasons.append({"Code": "ConditionalCheckFailed"})
+            if any(reason["Code"] != "None" for reason in reasons):
+                error = _error("TransactionCanceledException", "Transaction cancelled", "TransactWriteItems")
+                error.response["CancellationReasons"] = reasons
+                raise error
+
+            for operation, request, table in tables:
+                if operation == "Put":
+                    table.put(dict(request["Item"]))
+                    self._write_units(item_size(request["Item"]) * 2)
+                elif operation == "Update":
+                    key = table.key_of(request["Key"])
+                    item = json.loads(json.dumps(table.items.get(key) or dict(request["Key"])))
+                    apply_update(item, request["UpdateExpression"], request.get("ExpressionAttributeNames"), request.get("ExpressionAttributeValues"))
+                    table.put(item)
+                    self._write_units(item_size(item) * 2)
+                elif operation == "Delete":
+                    table.delete(table.key_of(request["Key"]))
+        finally:
+            for _, lock in reversed(locks):
+                lock.release()
+        return {}
@@ -0,0 +1,148 @@
+#1 imports - Load extracted receipts and link them to the client's transactions in bulk
+#
+#   python tools/match_receipts.py receipts.jsonl --client-id client-0001
+#   python tools/match_receipts.py --client-id client-0001 --stand-in --rows 20000 --receipts 5000
+#
+# Receipts are records extracted from the uploaded documents (amount, date, merchant, optionally receiptId and
+# document). They are written to the receipts table, matched through the amount/date index of receipt_matching,
+# and the links (hasReceipt/receiptRef on the transaction, transactionId on the receipt) written in batches.
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TOOLS_DIR, "..", "TaxReturnAgent", "MyobbSilverFinActionGroup"))
+sys.path.insert(0, TOOLS_DIR)
+
+import receipt_matching
+import result_cache
+import transactions_reader
+from ingest_transactions import BATCH_SIZE, Stats, read_rows, write_batch
+
+MERCHANTS = ["BP", "Officeworks", "JB Hi-Fi", "Bunnings", "Red Cross", "Harvey Norman", "Coles", "Telstra"]
+
+
+#2 Receipt records in the receipts table schema - the receiptId defaults to a hash of the receipt's content
+def to_receipt_item(client_id, record):
+    amount = float(str(record["amount"]).replace("$", "").replace(",", ""))
+    receipt_date = str(record["date"])[:10]
+    merchant = str(record.get("merchant") or "")
+    receipt_id = record.get("receiptId") or hashlib.sha1(
+        f"{client_id}|{record.get('document')}|{receipt_date}|{merchant.lower()}|{amount:.2f}".encode()
+    ).hexdigest()[:20]
+    item = {
+        "clientId": {"S": client_id},
+        "receiptId": {"S": receipt_id},
+        "amount": {"N": repr(round(amount, 2))},
+        "date": {"S": receipt_date},
+        "merchant": {"S": merchant}
+    }
+    if record.get("document"):
+        item["document"] = {"S": str(record["document"])}
+    return item
+
+
+#3 Synthetic receipts for a share of the stand-in's transactions, with card surcharges and shifted dates
+def synthetic_receipts(transactions, count, seed=0):
+    generator = random.Random(seed)
+    for number, transaction in enumerate(generator.sample(transactions, min(count, len(transactions)))):
+        amount = float(transaction["amount"])
+        if generator.random() < 0.1:
+            amount = round(amount + generator.choice([-0.3, 0.2, 0.45]), 2)
+        receipt_date = date.fromisoformat(transaction["date"]) + timedelta(days=generator.randrange(-3, 4))
+        yield {
+            "amount": amount,
+            "date": receipt_date.isoformat(),
+            "merchant": generator.choice(MERCHANTS) + " " + transaction["transactionName"],
+            "document": f"receipt-{number:05d}.pdf"
+        }
+    # Receipts with no transaction behind them
+    for number in range(count // 20):
+        yield {"amount": 12345.67 + number, "date": "2025-05-01", "merchant": generator.choice(MERCHANTS), "document": f"orphan-{number:04d}.pdf"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Link extracted receipts to the client's transactions")
+    parser.add_argument("input", nargs="?", help="CSV, JSON Lines (.jsonl) or JSON array of extracted receipts")
+    parser.add_argument("--client-id", required=True)
+    parser.add_argument("--endpoint-url", help="DynamoDB Local endpoint")
+    parser.add_argument("--stand-in", action="store_true", help="use the in-memory stand-in seeded with synthetic data")
+    parser.add_argument("--rows", type=int, default=20000, help="stand-in only: transactions to seed")
+    parser.add_argument("--receipts", type=int, default=5000, help="stand-in only: synthetic receipts to match")
+    parser.add_argument("--dry-run", action="store_true", help="match but do not write the links")
+    args = parser.parse_args()
+
+    if args.stand_in:
+        import synthetic_data
+        client = synthetic_data.seeded_stand_in(0)
+        client.create_table(transactions_reader.RECEIPT_TABLE_NAME, transactions_reader.PARTITION_KEY, "receiptId")
+        table = client.tables[transactions_reader.TABLE_NAME]
+        rows = list(synthetic_data.generate_transactions(args.rows, client_id=args.client_id))
+        for row in rows:
+            table.put(synthetic_data.to_item(row))
+        records = synthetic_receipts(rows, args.receipts)
+    elif args.input:
+        import boto3
+        from botocore.config import Config
+        client = boto3.client("dynamodb", endpoint_url=args.endpoint_url, config=Config(retries={"mode": "adaptive", "max_attempts": 10}))
+        records = read_rows(args.input)
+    else:
+        parser.error("an input file is required unless --stand-in is used")
+
+    stats = Stats()
+    started = time.perf_counter()
+    batch = []
+    for record in records:
+        batch.append(to_receipt_item(args.client_id, record))
+        if len(batch) == BATCH_SIZE:
+            write_batch(client, transactions_reader.RECEIPT_TABLE_NAME, batch, stats)
+            batch = []
+    if batch:
+        write_batch(client, transactions_reader.RECEIPT_TABLE_NAME, batch, stats)
+    load_seconds = time.perf_counter() - started
+
+    deadline = time.monotonic() + 600
+    started = time.perf_counter()
+    receipts = transactions_reader.read_receipts(client, deadline, args.client_id)["items"]
+    transactions = transactions_reader.read_transactions(
+        client, deadline, client_id=args.client_id, fields=receipt_matching.RECEIPT_MATCH_FIELDS
+    )["items"]
+    read_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = receipt_matching.match_receipts(receipts, transactions)
+    match_seconds = time.perf_counter() - started
+
+    links = {"written": 0, "conflicts": 0, "failed": 0}
+    version_bumped = False
+    started = time.perf_counter()
+    if not args.dry_run and result["matches"]:
+        links = receipt_matching.write_links(client, args.client_id, result["matches"])
+        version_bumped = result_cache.bump_data_version(client, args.client_id)
+    write_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        "receipts": len(receipts),
+        "transactions": len(transactions),
+        "matched": len(result["matches"]),
+        "unmatched": len(result["unmatched"]),
+        "linksWritten": links["written"],
+        "conflicts": links["conflicts"],
+        "linksFailed": links["failed"],
+        "versionBumped": version_bumped,
+        "seconds": {
+            "load": round(load_seconds, 3),
+            "read": round(read_seconds, 3),
+            "match": round(match_seconds, 3),
+            "write": round(write_seconds, 3)
+        }
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#1 imports - Run a prompt file against the Bedrock agent across many sessions at once
+#
+#   python tools/run_prompt_suite.py prompts.txt --sessions 20 --concurrency 8 --output suite.jsonl
+#   python tools/run_prompt_suite.py prompts.txt --agent-id F95VFQLKN0 --alias-id S5KM0MEAKF --trace-mode summary
+#   python tools/run_prompt_suite.py prompts.txt --sessions 50 --replay recorded.jsonl --keep-timing
+#
+# Every session asks all the prompts in order, like a conversation; sessions run concurrently through
+# bedrock_agent_runtime.invoke_agent_batch. One JSON line per turn (output, latency, attempts, error) is written
+# as the turns complete, and a latency summary is printed at the end.
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_DIR)
+
+from UI import bedrock_agent_runtime
+from UI.perf_metrics import percentile
+
+
+#2 Prompts are separated by blank lines (prompts.txt), or one {"prompt": ...} object per line in .jsonl files
+def read_prompts(path):
+    with open(path, encoding="utf-8") as file:
+        if path.endswith((".jsonl", ".ndjson")):
+            return [json.loads(line)["prompt"] for line in file if line.strip()]
+        prompts = []
+        lines = []
+        for line in file:
+            if line.strip():
+                lines.append(line.rstrip("\n"))
+            elif lines:
+                prompts.append("\n".join(lines))
+                lines = []
+        if lines:
+            prompts.append("\n".join(lines))
+        return prompts
+
+
+#3 Summary of the run - the wall time against the sum of latencies shows what the concurrency bought
+def summarize(records, wall_seconds, concurrency):
+    completed = [record for record in records if not record.get("error")]
+    latencies = [record["latency_ms"] for record in completed]
+    first_chunks = [record["first_chunk_ms"] for record in completed if record.get("first_chunk_ms") is not None]
+    return {
+        "turns": len(records),
+        "completed": len(completed),
+        "errors": len(records) - len(completed),
+        "retries": sum(max(record.get("attempts", 1) - 1, 0) for record in records),
+        "concurrency": concurrency,
+        "wallSeconds": round(wall_seconds, 2),
+        "turnsPerMinute": round(len(completed) / wall_seconds * 60, 1) if wall_seconds else None,
+        "latencyMs": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "max": max(latencies, default=None)},
+        "firstChunkMs": {"p50": percentile(first_chunks, 50), "p95": percentile(first_chunks, 95)},
+        "sequentialSeconds": round(sum(latencies) / 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a prompt file against the Bedrock agent across concurrent sessions")
+    parser.add_argument("prompts", help="prompt file - blank-line separated text, or JSON lines with a prompt field")
+    parser.add_argument("--sessions", type=int, default=1, help="sessions that each ask every prompt in order")
+    parser.add_argument("--concurrency", type=int, default=bedrock_agent_runtime.BEDROCK_BATCH_CONCURRENCY, help="sessions in flight at once")
+    parser.add_argument("--agent-id", help="defaults to BEDROCK_AGENT_ID")
+    parser.add_argument("--alias-id", help="defaults to BEDROCK_AGENT_ALIAS_ID")
+    parser.add_argument("--trace-mode", default="off", choices=["off", "summary", "full"])
+    parser.add_argument("--output", help="write one JSON line per turn to this file")
+    parser.add_argument("--record", help="append the raw completion events of every turn to this JSON lines file")
+    parser.add_argument("--replay", help="serve the turns from a recording made with --record instead of calling AWS")
+    parser.add_argument("--keep-timing", action="store_true", help="replay with the recorded delays between events")
+    args = parser.parse_args()
+
+    if args.record:
+        bedrock_agent_runtime.BEDROCK_RECORD_PATH = args.record
+    if args.replay:
+        bedrock_agent_runtime.BEDROCK_REPLAY_PATH = args.replay
+        bedrock_agent_runtime.BEDROCK_REPLAY_KEEP_TIMING = args.keep_timing
+
+    prompts = read_prompts(args.prompts)
+    if not prompts:
+        parser.error(f"no prompts in {args.prompts}")
+    run_id = uuid.uuid4().hex[:8]
+    turns = [(f"suite-{run_id}-{session:04d}", prompt) for session in range(args.sessions) for prompt in prompts]
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    lock = threading.Lock()
+    done = [0]
+
+    def on_result(position, record):
+        record = dict(record, prompt_index=position % len(prompts))
+        with lock:
+            done[0] += 1
+            if output:
+                output.write(json.dumps(record, default=str) + "\n")
+                output.flush()
+            status = record["error"] or f"{record['latency_ms']:.0f} ms"
+            print(f"[{done[0]}/{len(turns)}] {record['session_id']} prompt {record['prompt_index']}: {status}", file=sys.stderr)
+
+    started = time.perf_counter()
+    try:
+        records = bedrock_agent_runtime.invoke_agent_batch(
+            turns,
+            agent_id=args.agent_id,
+            agent_alias_id=args.alias_id,
+            concurrency=args.concurrency,
+            trace_mode=args.trace_mode,
+            on_result=on_result
+        )
+    finally:
+        if output:
+            output.close()
+    print(json.dumps(summarize(records, time.perf_counter() - started, args.concurrency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#1 imports - Synthetic MYOB/Silverfin transactions for benchmarks and local runs
+import hashlib
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "TaxReturnAgent", "MyobbSilverFinActionGroup"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import local_dynamodb
+import result_cache
+import transactions_reader
+
+# Transaction names loosely follow the deduction sections of TaxReturnAgent/Questionaire.txt
+TRANSACTION_NAMES = [
+    "Motor vehicle expenses", "Fuel - BP Collins St", "Car service and rego", "Buy a laptop",
+    "Office chair", "Union membership fees", "Professional association fees", "Red Cross donation",
+    "Tax agent fees", "Self-education course fees", "Textbooks", "Uniform and laundry",
+    "Home office electricity", "Mobile phone plan", "Internet plan", "Interest on investment loan",
+    "Share portfolio management fee", "Private health insurance", "Woolworths groceries", "Rent",
+]
+FINANCIAL_YEAR_START = date(2024, 7, 1)
+
+
+#2 Generate rows in the `date`/`transactionName`/`amount`/`hasReceipt` shape of openai_schema.yml
+def generate_transactions(count, client_id="client-0001", seed=0):
+    generator = random.Random(f"{client_id}:{seed}")
+    for number in range(count):
+        transaction_date = FINANCIAL_YEAR_START + timedelta(days=generator.randrange(365))
+        name = generator.choice(TRANSACTION_NAMES)
+        # Mostly small amounts with a long tail of large ones
+        amount = round(min(generator.lognormvariate(5, 1.4), 90000), 2)
+        row = {
+            "clientId": client_id,
+            "date": transaction_date.isoformat(),
+            "transactionName": name,
+            "amount": amount,
+            "hasReceipt": generator.random() < 0.7,
+            "source": "myob" if number % 2 == 0 else "silverfin",
+        }
+        row["transactionId"] = hashlib.sha1(f"{client_id}:{number}:{row['date']}:{name}:{amount}".encode()).hexdigest()[:20]
+        yield row
+
+
+def to_item(row):
+    item = {}
+    for name, value in row.items():
+        if isinstance(value, bool):
+            item[name] = {"BOOL": value}
+        elif isinstance(value, (int, float)):
+            item[name] = {"N": str(value)}
+        else:
+            item[name] = {"S": str(value)}
+    return item
+
+
+#3 A stand-in with the transactions table (+ date GSI) and the version table, seeded with rows per client
+def seeded_stand_in(rows_per_client, clients=1, seed=0, **stand_in_kwargs):
+    stand_in = local_dynamodb.LocalDynamoDB(**stand_in_kwargs)
+    table = stand_in.create_table(
+        transactions_reader.TABLE_NAME,
+        transactions_reader.PARTITION_KEY,
+        "transactionId",
+        indexes={transactions_reader.DATE_INDEX_NAME: (transactions_reader.PARTITION_KEY, transactions_reader.DATE_ATTRIBUTE)}
+    )
+    stand_in.create_table(result_cache.VERSION_TABLE_NAME, "clientId")
+    for client_number in range(clients):
+        for row in generate_transactions(rows_per_client, client_id=client_id_for(client_number), seed=seed):
+            table.put(to_item(row))
+    return stand_in
+
+
+def client_id_for(client_number):
+    return f"client-{client_number + 1:04d}"
+
+
+#4 A Bedrock agent action group event - https://docs.aws.amazon.com/bedrock/latest/userguide/agents-lambda.html#agents-lambda-input
+def agent_event(api_path="/transactions", client_id="client-0001", parameters=None):
+    return {
+        "messageVersion": "1.0",
+        "agent": {"name": "benchmark", "id": "LOCAL", "alias": "LOCAL", "version": "DRAFT"},
+        "actionGroup": "MyobbSilverFinActionGroup",
+        "apiPath": api_path,
+        "httpMethod": "GET",
+        "parameters": [{"name": name, "type": "string", "value": value} for name, value in (parameters or {}).items()],
+        "sessionAttributes": {"clientId": client_id} if client_id else {},
+        "promptSessionAttributes": {},
+    }